@@ -0,0 +1,191 @@
+import sys
+import json
+import time
+import sqlite3
+import datetime
+import argparse
+from TaskTimerCore import TaskTimeDb, TasksData, TasksDb, TasksJournal, DataFile, TimeFormatter, TimesheetExporter
+
+
+class TaskTimerCli(object):
+  def __init__(self, args, output):
+    self.args = args
+    self.output = output
+    self.dataFile = DataFile('tasksData.json')
+
+  def openTasks(self, db, readOnly):
+    if self.args.sqlite:
+      return TasksDb(db, None if readOnly else self.dataFile.forLoad(), resume=not readOnly)
+    binaryTimes = self.args.binary
+    journal = TasksJournal(DataFile('tasksData.journal')) if self.args.journal or binaryTimes else None
+    return TasksData(self.dataFile.forLoad(), journal, DataFile('tasksData.times') if binaryTimes else None, resume=not readOnly, readOnly=readOnly)
+
+  def write(self, fields, rows):
+    if self.args.format == 'csv':
+      import csv
+      writer = csv.DictWriter(self.output, fields, lineterminator='\n')
+      writer.writeheader()
+      writer.writerows(rows)
+    else:
+      json.dump(rows, self.output)
+      self.output.write('\n')
+
+  def report(self):
+    db = TaskTimeDb(None, readOnly=True)
+    rows = [item.toDict() for item in db.getReport(self.args.fromDay, self.args.toDay)]
+    db.dataConn.close()
+    self.write(('day', 'start', 'end', 'lunchStart', 'lunchEnd', 'workTime', 'lunchTime'), rows)
+
+  def taskTime(self):
+    db = TaskTimeDb(None, readOnly=True) if self.args.sqlite else None
+    tasks = self.openTasks(db, True)
+    rows = [{'name' : name, 'time' : tasks.getTaskTimeTillNow(name)} for name in self.args.names]
+    tasks.close()
+    if db is not None:
+      db.dataConn.close()
+    self.write(('name', 'time'), rows)
+
+  def taskReport(self):
+    db = TaskTimeDb(None, readOnly=True) if self.args.sqlite else None
+    tasks = self.openTasks(db, True)
+    rows = [{'period' : period, 'name' : name, 'time' : seconds} for period, name, seconds in tasks.getPeriodTaskTimes(self.args.by)]
+    tasks.close()
+    if db is not None:
+      db.dataConn.close()
+    self.write(('period', 'name', 'time'), rows)
+
+  def taskAt(self):
+    db = TaskTimeDb(None, readOnly=True) if self.args.sqlite else None
+    tasks = self.openTasks(db, True)
+    start = self.args.when.timestamp()
+    if self.args.to is None:
+      rows = [{'name' : tasks.getTaskAt(start), 'start' : start, 'end' : start}]
+    else:
+      rows = [{'name' : name, 'start' : begin, 'end' : end} for name, begin, end in tasks.getOverlappingTimes(start, self.args.to.timestamp())]
+    tasks.close()
+    if db is not None:
+      db.dataConn.close()
+    self.write(('name', 'start', 'end'), rows)
+
+  def reassign(self):
+    db = TaskTimeDb(None) if self.args.sqlite else None
+    tasks = self.openTasks(db, False)
+    tasks.reassign(self.args.start.timestamp(), self.args.end.timestamp(), self.args.name)
+    tasks.keepTimingWhenOff = True
+    tasks.save(self.dataFile.forSave() if tasks.needsSnapshot() else None)
+    tasks.close()
+    if db is not None:
+      db.dataConn.close()
+
+  def export(self):
+    db = TaskTimeDb(None, readOnly=True) if self.args.sqlite or self.args.kind == 'days' else None
+    exporter = TimesheetExporter(self.args.exportFormat, TimeFormatter(self.args.timeFormat, False))
+    if self.args.output is None:
+      self.writeExport(exporter, db, self.output)
+    else:
+      with DataFile(self.args.output).forSave('') as target:
+        self.writeExport(exporter, db, target)
+    if db is not None:
+      db.dataConn.close()
+
+  def writeExport(self, exporter, db, target):
+    if self.args.kind == 'days':
+      exporter.exportDays(db.iterReport(self.args.fromDay or datetime.date.min, self.args.toDay or datetime.date.max), target)
+    else:
+      tasks = self.openTasks(db, True)
+      start = time.mktime(self.args.fromDay.timetuple()) if self.args.fromDay is not None else None
+      end = time.mktime((self.args.toDay + datetime.timedelta(days=1)).timetuple()) if self.args.toDay is not None else None
+      exporter.exportTimes(tasks.iterTimes(start, end, self.args.task), target)
+      tasks.close()
+
+  def switch(self):
+    db = TaskTimeDb(None) if self.args.sqlite else None
+    tasks = self.openTasks(db, False)
+    tasks.add(self.args.name)
+    tasks.keepTimingWhenOff = True
+    tasks.save(self.dataFile.forSave() if tasks.needsSnapshot() else None)
+    tasks.close()
+    if db is not None:
+      db.dataConn.close()
+
+  def event(self):
+    db = TaskTimeDb(self.args.id == 'close')
+    db.dataConn.close()
+
+  def rollup(self):
+    db = TaskTimeDb(None)
+    days = db.rollup(self.args.before)
+    tasks = self.openTasks(db, False)
+    if self.args.sqlite:
+      switches = tasks.rollup(self.args.before)
+    else:
+      switches = tasks.rollup(self.args.before, DataFile('tasksData.archive'))
+      tasks.keepTimingWhenOff = True
+      tasks.save(self.dataFile.forSave())
+    tasks.close()
+    db.dataConn.close()
+    self.write(('days', 'switches'), [{'days' : days, 'switches' : switches}])
+
+  def run(self):
+    getattr(self, self.args.command)()
+
+
+def parseDay(text):
+  return datetime.date.fromisoformat(text)
+
+
+def parseTime(text):
+  return datetime.datetime.fromisoformat(text)
+
+
+def parseArgs(argv):
+  parser = argparse.ArgumentParser(prog='TaskTimerCli')
+  parser.add_argument('--format', choices=('json', 'csv'), default='json')
+  parser.add_argument('--sqlite', action='store_true')
+  parser.add_argument('--journal', action='store_true')
+  parser.add_argument('--binary', action='store_true')
+  commands = parser.add_subparsers(dest='command', required=True)
+  report = commands.add_parser('report')
+  report.add_argument('--from', dest='fromDay', type=parseDay, default=datetime.date.today())
+  report.add_argument('--to', dest='toDay', type=parseDay, default=datetime.date.today())
+  taskTime = commands.add_parser('task-time')
+  taskTime.add_argument('names', nargs='+', metavar='NAME')
+  taskReport = commands.add_parser('task-report')
+  taskReport.add_argument('--by', choices=('day', 'week'), default='day')
+  taskAt = commands.add_parser('task-at')
+  taskAt.add_argument('when', type=parseTime, metavar='TIME')
+  taskAt.add_argument('--to', type=parseTime)
+  reassign = commands.add_parser('reassign')
+  reassign.add_argument('start', type=parseTime, metavar='START')
+  reassign.add_argument('end', type=parseTime, metavar='END')
+  reassign.add_argument('name', metavar='NAME')
+  export = commands.add_parser('export')
+  export.add_argument('kind', choices=('days', 'tasks'))
+  export.add_argument('exportFormat', choices=TimesheetExporter.formats, metavar='FORMAT')
+  export.add_argument('--from', dest='fromDay', type=parseDay)
+  export.add_argument('--to', dest='toDay', type=parseDay)
+  export.add_argument('--task')
+  export.add_argument('--output')
+  export.add_argument('--time-format', dest='timeFormat', default='hms')
+  switch = commands.add_parser('switch')
+  switch.add_argument('name', metavar='NAME')
+  event = commands.add_parser('event')
+  event.add_argument('id', choices=('open', 'close'))
+  rollup = commands.add_parser('rollup')
+  rollup.add_argument('--before', type=parseDay, default=datetime.date.today())
+  args = parser.parse_args(argv)
+  args.command = {'task-time' : 'taskTime', 'task-report' : 'taskReport', 'task-at' : 'taskAt'}.get(args.command, args.command)
+  return args
+
+
+def main(argv=None, output=None):
+  try:
+    TaskTimerCli(parseArgs(argv), output or sys.stdout).run()
+  except sqlite3.OperationalError as error:
+    sys.stderr.write('TaskTimerCli: error: %s\n' % error)
+    return 1
+  return 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,10 @@
+from .writer import Transaction, DirectWriter, BackgroundWriter
+from .db import TaskTimeDb, DayReport
+from .tasks import TaskState, TaskTime, TasksData, TasksDb, TimesStore, TimesIndex, TasksJournal
+from .files import DataFile, ReplacingFile
+from .formatting import TimeFormatter
+from .presence import PresenceSource, FakePresenceSource
+from .clock import WorkClock
+from .aggregate import TaskAggregator
+from .export import TimesheetExporter
+from .stats import Histogram, Stats, TimedCursor, TimedConnection
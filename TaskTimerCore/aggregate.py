@@ -0,0 +1,84 @@
+import time
+import bisect
+import datetime
+
+
+class TaskAggregator(object):
+  useNumpy = True
+  periods = ('day', 'week')
+
+  def __init__(self, period='day'):
+    if period not in TaskAggregator.periods:
+      raise ValueError('unknown aggregation period: ' + str(period))
+    self.period = period
+
+  def getMidnights(self, first, last):
+    day = datetime.date.fromtimestamp(first)
+    lastDay = datetime.date.fromtimestamp(last) + datetime.timedelta(days=1)
+    days = []
+    midnights = []
+    while day <= lastDay:
+      days.append(day)
+      midnights.append(time.mktime((day.year, day.month, day.day, 0, 0, 0, 0, 0, -1)))
+      day += datetime.timedelta(days=1)
+    return days, midnights
+
+  def getPeriod(self, day):
+    if self.period == 'week':
+      day -= datetime.timedelta(days=day.weekday())
+    return day.isoformat()
+
+  def aggregate(self, times, end=None, summary=()):
+    names = [item.name for item in times]
+    epochs = [item.getTime() for item in times]
+    if end is not None and len(epochs) > 0 and end > epochs[-1]:
+      epochs.append(end)
+    totals = {}
+    if len(epochs) > 1:
+      days, midnights = self.getMidnights(epochs[0], epochs[-1])
+      groups = self.groupNumpy(names, epochs, midnights) if self.useNumpy else None
+      if groups is None:
+        groups = self.groupPython(names, epochs, midnights)
+      for (name, dayIndex), seconds in groups:
+        key = (self.getPeriod(days[dayIndex]), name)
+        totals[key] = totals.get(key, 0.0) + seconds
+    for (day, name), seconds in summary:
+      key = (self.getPeriod(datetime.date.fromisoformat(day)), name)
+      totals[key] = totals.get(key, 0.0) + seconds
+    return [(period, name, seconds) for (period, name), seconds in sorted(totals.items(), key=lambda item : (item[0][0], item[0][1] or ''))]
+
+  def groupPython(self, names, epochs, midnights):
+    groups = {}
+    for index in range(len(epochs) - 1):
+      start, end = epochs[index], epochs[index + 1]
+      dayIndex = bisect.bisect_right(midnights, start) - 1
+      while start < end:
+        pieceEnd = min(end, midnights[dayIndex + 1])
+        key = (names[index], dayIndex)
+        groups[key] = groups.get(key, 0.0) + pieceEnd - start
+        start = pieceEnd
+        dayIndex += 1
+    return groups.items()
+
+  def groupNumpy(self, names, epochs, midnights):
+    try:
+      import numpy
+    except ImportError:
+      return None
+    codes = {}
+    nameCodes = numpy.fromiter((codes.setdefault(name, len(codes)) for name in names[:len(epochs) - 1]), numpy.int64, len(epochs) - 1)
+    epochs = numpy.asarray(epochs, numpy.float64)
+    midnights = numpy.asarray(midnights, numpy.float64)
+    starts, ends = epochs[:-1], epochs[1:]
+    startDays = numpy.searchsorted(midnights, starts, 'right') - 1
+    endDays = numpy.searchsorted(midnights, ends, 'left') - 1
+    pieces = numpy.maximum(endDays - startDays + 1, 0)
+    interval = numpy.repeat(numpy.arange(len(starts)), pieces)
+    pieceDays = startDays[interval] + numpy.arange(len(interval)) - numpy.repeat(numpy.cumsum(pieces) - pieces, pieces)
+    seconds = numpy.minimum(ends[interval], midnights[pieceDays + 1]) - numpy.maximum(starts[interval], midnights[pieceDays])
+    positive = seconds > 0
+    interval, pieceDays, seconds = interval[positive], pieceDays[positive], seconds[positive]
+    keys, inverse = numpy.unique(nameCodes[interval] * len(midnights) + pieceDays, return_inverse=True)
+    sums = numpy.bincount(inverse.ravel(), seconds, len(keys))
+    codeNames = list(codes)
+    return [((codeNames[key // len(midnights)], key % len(midnights)), total) for key, total in zip(keys.tolist(), sums.tolist())]
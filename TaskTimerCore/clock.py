@@ -0,0 +1,48 @@
+import time
+import datetime
+
+
+class WorkClock(object):
+  jumpTolerance = 2.0
+  resyncInterval = 300.0
+
+  def __init__(self, db, monotonic=time.monotonic, wallClock=time.time):
+    self.db = db
+    self.monotonic = monotonic
+    self.wallClock = wallClock
+    self.syncs = 0
+    self.resync()
+
+  def resync(self):
+    self.state = self.db.getTodayState()
+    self.generation = self.db.generation if not self.db.writer.pending() else None
+    self.syncMonotonic = self.lastMonotonic = self.monotonic()
+    self.syncWall = self.lastWall = self.wallClock()
+    nextDay = datetime.date.fromtimestamp(self.syncWall) + datetime.timedelta(days=1)
+    self.dayEnd = time.mktime((nextDay.year, nextDay.month, nextDay.day, 0, 0, 0, 0, 0, -1))
+    self.syncs += 1
+
+  def isStale(self, monotonicNow, wallNow):
+    if self.generation != self.db.generation or wallNow >= self.dayEnd:
+      return True
+    if monotonicNow - self.syncMonotonic >= WorkClock.resyncInterval:
+      return True
+    return abs((wallNow - self.lastWall) - (monotonicNow - self.lastMonotonic)) > WorkClock.jumpTolerance
+
+  def now(self):
+    monotonicNow = self.monotonic()
+    wallNow = self.wallClock()
+    if self.isStale(monotonicNow, wallNow):
+      self.resync()
+      return self.syncWall
+    self.lastMonotonic, self.lastWall = monotonicNow, wallNow
+    return self.syncWall + monotonicNow - self.syncMonotonic
+
+  def getWorkTime(self):
+    now = self.now()
+    workTime = self.db.getStateWorkTime(self.state, now)
+    return workTime - self.db.getEffectiveLunchTime(workTime, self.state[2])
+
+  def getTickDelay(self):
+    elapsed = self.monotonic() - self.syncMonotonic
+    return int((1.0 - (self.syncWall + elapsed) % 1.0) * 1000) + 1
@@ -0,0 +1,343 @@
+import time
+import os
+import sqlite3
+import datetime
+from .writer import Transaction, DirectWriter, BackgroundWriter
+from .stats import TimedConnection
+
+
+class TaskTimeDb:
+  schema = (
+    ('CREATE TABLE IF NOT EXISTS Event(id TEXT, time TEXT)',),
+    ('ALTER TABLE Event ADD COLUMN day TEXT',
+     'ALTER TABLE Event ADD COLUMN epoch INTEGER',
+     'UPDATE Event SET day = date(time), epoch = CAST(strftime("%s", time, "utc") AS INTEGER)',
+     'CREATE INDEX EventDay ON Event(day, id, time)',
+     'CREATE INDEX EventTime ON Event(time)',
+     '''CREATE TRIGGER EventFill AFTER INSERT ON Event WHEN NEW.day IS NULL OR NEW.epoch IS NULL BEGIN
+          UPDATE Event SET day = date(NEW.time), epoch = CAST(strftime("%s", NEW.time, "utc") AS INTEGER) WHERE rowid = NEW.rowid;
+        END'''),
+    ('CREATE TABLE Task(id INTEGER PRIMARY KEY, name TEXT, reportedTime REAL, active INTEGER)',
+     'CREATE TABLE TaskSwitch(taskId INTEGER, epoch REAL, endEpoch REAL, day TEXT)',
+     'CREATE INDEX TaskSwitchEpoch ON TaskSwitch(epoch)',
+     'CREATE INDEX TaskSwitchTask ON TaskSwitch(taskId, epoch, endEpoch)',
+     'CREATE INDEX TaskSwitchDay ON TaskSwitch(day, taskId, epoch, endEpoch)'),
+    ('CREATE TABLE DayLunch(day TEXT PRIMARY KEY, start INTEGER, startTime TEXT, end INTEGER)',
+     'INSERT INTO DayLunch(day, start, startTime) SELECT day, epoch, MIN(time) FROM Event WHERE id = "lunch" GROUP BY day',
+     'UPDATE DayLunch SET end = (SELECT epoch FROM Event WHERE time > DayLunch.startTime ORDER BY time LIMIT 1)',
+     'UPDATE Event SET id = "close" WHERE id = "lunch"'),
+    ('ALTER TABLE Event ADD COLUMN utcOffset INTEGER',
+     'UPDATE Event SET utcOffset = CAST(strftime("%s", time) AS INTEGER) - epoch',
+     'DROP INDEX EventDay',
+     'DROP INDEX EventTime',
+     'CREATE INDEX EventDay ON Event(day, id, epoch)',
+     'CREATE INDEX EventEpoch ON Event(epoch)',
+     'DROP TRIGGER EventFill',
+     '''CREATE TRIGGER EventFill AFTER INSERT ON Event WHEN NEW.day IS NULL OR NEW.epoch IS NULL OR NEW.utcOffset IS NULL BEGIN
+          UPDATE Event SET day = date(NEW.time), epoch = CAST(strftime("%s", NEW.time, "utc") AS INTEGER),
+            utcOffset = CAST(strftime("%s", NEW.time) AS INTEGER) - CAST(strftime("%s", NEW.time, "utc") AS INTEGER) WHERE rowid = NEW.rowid;
+        END'''),
+    ('CREATE TABLE DaySummary(day TEXT PRIMARY KEY, start INTEGER, end INTEGER)',
+     'CREATE TABLE EventArchive(id TEXT, time TEXT, day TEXT, epoch INTEGER, utcOffset INTEGER)',
+     'CREATE TABLE TaskDaySummary(day TEXT, taskId INTEGER, seconds REAL, PRIMARY KEY(day, taskId))',
+     'CREATE TABLE TaskSwitchArchive(taskId INTEGER, epoch REAL, endEpoch REAL, day TEXT)'),
+  )
+  pragmas = (('journal_mode', 'WAL'), ('synchronous', 'NORMAL'), ('cache_size', -8000))
+  stats = None
+
+  def __init__(self, background, dbName = 'TaskTimer.db', threaded=False, readOnly=False):
+    self.openId = 'open'
+    self.closeId = 'close'
+    self.generation = 0
+    self.dataVersion = None
+    self.lastEvent = None
+    self.cacheKey = None
+    self.cacheState = None
+    self.cacheHits = 0
+    self.cacheMisses = 0
+    self.readOnly = readOnly
+    self.dataConn = self.connect(dbName)
+    self.transaction = Transaction(self.dataConn)
+    self.migrate()
+    self.writer = BackgroundWriter(lambda: self.connect(dbName)) if threaded else DirectWriter(self.transaction)
+    self.syncExternalWrites()
+    if background is not None:
+      self.addEvent(self.closeId if background else self.openId)
+
+  def connect(self, dbName):
+    dataConn = self.openConnection(dbName, sqlite3.Connection if TaskTimeDb.stats is None else TimedConnection)
+    if TaskTimeDb.stats is not None:
+      dataConn.stats = TaskTimeDb.stats
+    return dataConn
+
+  def openConnection(self, dbName, factory):
+    if dbName == ':memory:':
+      return sqlite3.connect(dbName, factory=factory)
+    dataDir = 'data'
+    if self.readOnly:
+      return sqlite3.connect('file:' + os.path.join(dataDir, dbName) + '?mode=ro', uri=True, factory=factory)
+    if not os.path.exists(dataDir):
+      os.mkdir(dataDir)
+    dataConn = sqlite3.connect(os.path.join(dataDir, dbName), factory=factory)
+    for name, value in TaskTimeDb.pragmas:
+      dataConn.execute('PRAGMA ' + name + ' = ' + str(value))
+    return dataConn
+
+  def migrate(self):
+    curs = self.dataConn.cursor()
+    version = curs.execute('PRAGMA user_version').fetchone()[0]
+    if version >= len(TaskTimeDb.schema):
+      return
+    if self.readOnly:
+      raise sqlite3.OperationalError('schema version ' + str(version) + ' needs migration to ' + str(len(TaskTimeDb.schema)))
+    curs.execute('BEGIN')
+    try:
+      for statements in TaskTimeDb.schema[version:]:
+        for statement in statements:
+          curs.execute(statement)
+      curs.execute('PRAGMA user_version = ' + str(len(TaskTimeDb.schema)))
+    except:
+      self.dataConn.rollback()
+      raise
+    self.dataConn.commit()
+
+  def close(self):
+    self.addEvent(self.closeId)
+  
+  def addEvent(self, id):
+    self.syncExternalWrites()
+    if self.lastEvent is not None and self.lastEvent[0] != id or self.lastEvent is None and id != self.closeId:
+      now = time.time()
+      localNow = time.localtime(now)
+      event = (id, time.strftime('%Y-%m-%d %H:%M:%S', localNow), time.strftime('%Y-%m-%d', localNow), int(now), localNow.tm_gmtoff)
+      previous = self.lastEvent
+      self.writer.submit(lambda dataConn: self.writeEvent(previous, event, dataConn))
+      if self.lastEvent is None or event[3] >= self.lastEvent[3]:
+        self.lastEvent = event
+      self.generation += 1
+
+  def addEvents(self, events):
+    self.syncExternalWrites()
+    rows = []
+    for id, epoch in events:
+      localNow = time.localtime(epoch)
+      rows.append((id, time.strftime('%Y-%m-%d %H:%M:%S', localNow), time.strftime('%Y-%m-%d', localNow), int(epoch), localNow.tm_gmtoff))
+    if len(rows) == 0:
+      return
+    previous = self.lastEvent
+    self.writer.submit(lambda dataConn: self.writeEvents(previous, rows, dataConn))
+    if self.lastEvent is None or rows[-1][3] >= self.lastEvent[3]:
+      self.lastEvent = rows[-1]
+    self.generation += 1
+
+  def writeEvent(self, previous, event, dataConn):
+    dataConn.execute('INSERT INTO Event(id, time, day, epoch, utcOffset) VALUES(?, ?, ?, ?, ?)', event)
+    self.updateLunch(previous, event, dataConn)
+
+  def writeEvents(self, previous, events, dataConn):
+    dataConn.executemany('INSERT INTO Event(id, time, day, epoch, utcOffset) VALUES(?, ?, ?, ?, ?)', events)
+    for event in events:
+      self.updateLunch(previous, event, dataConn)
+      previous = event
+
+  def updateLunch(self, previous, event, dataConn=None):
+    curs = (dataConn or self.dataConn).cursor()
+    if previous is not None and previous[0] == self.closeId and previous[2] == event[2]:
+      curs.execute('UPDATE DayLunch SET end = :end WHERE day = :day AND start = :start AND end IS NULL',
+        {'end' : event[3], 'day' : previous[2], 'start' : previous[3]})
+    lunchStart = self.getLocalEpoch(datetime.date.fromisoformat(event[2]), 11)
+    if event[3] < lunchStart or previous is not None and previous[3] >= lunchStart:
+      return
+    if event[0] == self.closeId:
+      lunch = (event[2], event[3], event[1], None)
+    elif previous is not None and previous[0] == self.closeId and previous[2] == event[2]:
+      lunch = (event[2], previous[3], previous[1], event[3])
+    else:
+      return
+    curs.execute('INSERT OR IGNORE INTO DayLunch(day, start, startTime, end) VALUES(?, ?, ?, ?)', lunch)
+
+  def loadLastEvent(self):
+    if not self.writer.pending():
+      self.lastEvent = self.dataConn.cursor().execute('SELECT id, time, day, epoch, utcOffset FROM Event ORDER BY epoch DESC, rowid DESC LIMIT 1').fetchone()
+
+  def getLocalEpoch(self, day, hour):
+    return int(time.mktime((day.year, day.month, day.day, hour, 0, 0, 0, 0, -1)))
+
+  def syncExternalWrites(self):
+    dataVersion = self.dataConn.execute('PRAGMA data_version').fetchone()[0]
+    if dataVersion != self.dataVersion:
+      self.dataVersion = dataVersion
+      self.loadLastEvent()
+      self.generation += 1
+
+  def getTodayState(self):
+    self.syncExternalWrites()
+    key = (self.generation, datetime.date.today())
+    if key == self.cacheKey:
+      self.cacheHits += 1
+      return self.cacheState
+    self.cacheMisses += 1
+    curs = self.dataConn.cursor()
+    startTime, lastTime = None, None
+    self.loadLastEvent()
+    lastData = self.lastEvent
+    if lastData is not None:
+      day = lastData[2] if lastData[0] == self.closeId else key[1].isoformat()
+      lastTime = lastData[3] if lastData[0] == self.closeId else None
+      startTime = curs.execute('SELECT epoch FROM Event WHERE day = :day AND id != :closeId ORDER BY epoch LIMIT 1',
+        {'day' : day, 'closeId' : self.closeId}).fetchone()
+    self.cacheKey = key
+    self.cacheState = (startTime[0] if startTime is not None else None, lastTime, self.getLunchInterval(key[1]))
+    return self.cacheState
+
+  def getTodayWorkTime(self):
+    return self.getStateWorkTime(self.getTodayState(), time.time())
+
+  def getStateWorkTime(self, state, now):
+    startTime, lastTime, lunchTime = state
+    if startTime is None:
+      return datetime.timedelta(0)
+    return datetime.timedelta(seconds=(int(now) if lastTime is None else lastTime) - startTime)
+
+  def getDayWorkTime(self, day):
+    curs = self.dataConn.cursor()
+    summary = curs.execute('SELECT start, end FROM DaySummary WHERE day = :day', {'day' : day.isoformat()}).fetchone()
+    if summary is not None:
+      if summary[0] is None or summary[1] is None:
+        return datetime.timedelta(0)
+      return datetime.timedelta(seconds=summary[1] - summary[0])
+    startTime = curs.execute('SELECT epoch FROM Event WHERE day = :day AND id != :closeId ORDER BY epoch LIMIT 1',
+      {'day' : day.isoformat(), 'closeId' : self.closeId}).fetchone()
+    lastTime = curs.execute('SELECT epoch FROM Event WHERE day = :day AND id = :closeId ORDER BY epoch DESC LIMIT 1',
+      {'day' : day.isoformat(), 'closeId' : self.closeId}).fetchone()
+    if startTime is None or lastTime is None:
+      return datetime.timedelta(0)
+    return datetime.timedelta(seconds=lastTime[0] - startTime[0])
+
+  def getLunchTime(self, day=None):
+    if day is None:
+      workTime = self.getTodayWorkTime()
+      lunchTime = self.getTodayState()[2]
+    else:
+      workTime = self.getDayWorkTime(day)
+      lunchTime = self.getLunchInterval(day)
+    return self.getEffectiveLunchTime(workTime, lunchTime)
+
+  def getEffectiveLunchTime(self, workTime, lunchTime):
+    minLunchTime = datetime.timedelta(minutes=30 if workTime >= datetime.timedelta(hours=6) else 0)
+    if lunchTime is not None:
+      return max(minLunchTime, lunchTime)
+    return minLunchTime
+
+  def getLunchInterval(self, day):
+    lunch = self.dataConn.execute('SELECT start, end FROM DayLunch WHERE day = :day', {'day' : day.isoformat()}).fetchone()
+    if lunch is not None and lunch[1] is not None:
+      return datetime.timedelta(seconds=lunch[1] - lunch[0])
+    return None
+
+  def getReport(self, fromDay, toDay):
+    days = {}
+    dayRange = {'fromDay' : fromDay.isoformat(), 'toDay' : toDay.isoformat()}
+    for day, start, end in self.dataConn.execute('SELECT day, start, end FROM DaySummary WHERE day >= :fromDay AND day <= :toDay', dayRange):
+      report = days[day] = DayReport(datetime.date.fromisoformat(day))
+      report.start, report.end = start, end
+    for id, day, epoch in self.dataConn.execute('''SELECT id, day, epoch FROM Event
+      WHERE day >= :fromDay AND day <= :toDay ORDER BY epoch, rowid''', dayRange):
+      report = days.get(day)
+      if report is None:
+        report = days[day] = DayReport(datetime.date.fromisoformat(day))
+      if id != self.closeId and report.start is None:
+        report.start = epoch
+      if id == self.closeId:
+        report.end = epoch
+    for day, start, end in self.dataConn.execute('SELECT day, start, end FROM DayLunch WHERE day >= :fromDay AND day <= :toDay', dayRange):
+      report = days.get(day)
+      if report is None:
+        report = days[day] = DayReport(datetime.date.fromisoformat(day))
+      report.lunchStart, report.lunchEnd = start, end
+    result = []
+    for dayIndex in range((toDay - fromDay).days + 1):
+      day = fromDay + datetime.timedelta(days=dayIndex)
+      report = days.get(day.isoformat()) or DayReport(day)
+      report.finish()
+      result.append(report)
+    return result
+
+  def iterReport(self, fromDay, toDay):
+    for day, start, end, lunchStart, lunchEnd in self.dataConn.execute('''SELECT days.day, days.start, days.end, DayLunch.start, DayLunch.end FROM (
+        SELECT day, MIN(CASE WHEN id != :closeId THEN epoch END) AS start, MAX(CASE WHEN id = :closeId THEN epoch END) AS end FROM Event
+        WHERE day >= :fromDay AND day <= :toDay GROUP BY day
+        UNION ALL SELECT day, start, end FROM DaySummary WHERE day >= :fromDay AND day <= :toDay) AS days
+      LEFT JOIN DayLunch ON DayLunch.day = days.day ORDER BY days.day''', {'fromDay' : fromDay.isoformat(), 'toDay' : toDay.isoformat(), 'closeId' : self.closeId}):
+      report = DayReport(datetime.date.fromisoformat(day))
+      report.start, report.end = start, end
+      report.lunchStart, report.lunchEnd = lunchStart, lunchEnd
+      report.finish()
+      yield report
+
+  def setLunchTime(self, day=None):
+    day = day or datetime.date.today()
+    with self.transaction as dataConn:
+      self.writeLunchTime(day, dataConn.cursor())
+
+  def writeLunchTime(self, day, curs):
+    if curs.execute('SELECT 1 FROM DayLunch WHERE day = :day', {'day' : day.isoformat()}).fetchone() is not None:
+      return
+    lunchStart = self.getLocalEpoch(day, 11)
+    lunchData = curs.execute('SELECT id, time, day, epoch FROM Event WHERE epoch >= :lunchStart AND day = :day ORDER BY epoch LIMIT 1',
+      {'lunchStart' : lunchStart, 'day' : day.isoformat()}).fetchone()
+    if lunchData is None:
+      return
+    if lunchData[0] != self.closeId:
+      lunchData = curs.execute('SELECT id, time, day, epoch FROM Event WHERE epoch < :lunchStart ORDER BY epoch DESC LIMIT 1', {'lunchStart' : lunchStart}).fetchone()
+    if lunchData is not None and lunchData[0] == self.closeId and lunchData[2] == day.isoformat():
+      lunchEnd = curs.execute('SELECT epoch FROM Event WHERE epoch > :lunchStart AND day = :day ORDER BY epoch LIMIT 1',
+        {'lunchStart' : lunchData[3], 'day' : day.isoformat()}).fetchone()
+      curs.execute('INSERT INTO DayLunch(day, start, startTime, end) VALUES(?, ?, ?, ?)',
+        (day.isoformat(), lunchData[3], lunchData[1], lunchEnd[0] if lunchEnd is not None else None))
+      self.generation += 1
+
+  def backfillLunch(self):
+    days = [row[0] for row in self.dataConn.execute('SELECT DISTINCT day FROM Event WHERE day NOT IN (SELECT day FROM DayLunch) ORDER BY day')]
+    with self.transaction:
+      for day in days:
+        self.setLunchTime(datetime.date.fromisoformat(day))
+    return len(days)
+
+  def rollup(self, before):
+    self.writer.flush()
+    self.loadLastEvent()
+    if self.lastEvent is not None:
+      before = min(before, datetime.date.fromisoformat(self.lastEvent[2]))
+    bounds = {'before' : before.isoformat(), 'closeId' : self.closeId}
+    with self.transaction as dataConn:
+      days = dataConn.execute('''INSERT OR REPLACE INTO DaySummary(day, start, end)
+        SELECT day, MIN(CASE WHEN id != :closeId THEN epoch END), MAX(CASE WHEN id = :closeId THEN epoch END) FROM Event
+        WHERE day < :before GROUP BY day''', bounds).rowcount
+      dataConn.execute('''INSERT INTO EventArchive(id, time, day, epoch, utcOffset)
+        SELECT id, time, day, epoch, utcOffset FROM Event WHERE day < :before ORDER BY epoch, rowid''', bounds)
+      dataConn.execute('DELETE FROM Event WHERE day < :before', bounds)
+    self.generation += 1
+    return days
+
+
+class DayReport(object):
+  __slots__ = ('day', 'start', 'end', 'lunchStart', 'lunchEnd', 'workTime', 'lunchTime')
+
+  def __init__(self, day):
+    self.day = day
+    self.start, self.end = None, None
+    self.lunchStart, self.lunchEnd = None, None
+    self.workTime = datetime.timedelta(0)
+    self.lunchTime = datetime.timedelta(0)
+
+  def finish(self):
+    if self.start is not None and self.end is not None:
+      self.workTime = datetime.timedelta(seconds=self.end - self.start)
+    self.lunchTime = datetime.timedelta(minutes=30 if self.workTime >= datetime.timedelta(hours=6) else 0)
+    if self.lunchStart is not None and self.lunchEnd is not None:
+      self.lunchTime = max(self.lunchTime, datetime.timedelta(seconds=self.lunchEnd - self.lunchStart))
+
+  def toDict(self):
+    return {'day' : self.day.isoformat(), 'start' : self.start, 'end' : self.end, 'lunchStart' : self.lunchStart, 'lunchEnd' : self.lunchEnd,
+            'workTime' : self.workTime.total_seconds(), 'lunchTime' : self.lunchTime.total_seconds()}
@@ -0,0 +1,84 @@
+import csv
+import json
+import time
+import zlib
+import datetime
+from .formatting import TimeFormatter
+
+
+class TimesheetExporter(object):
+  formats = ('csv', 'jsonl', 'ics')
+  taskFields = ('task', 'start', 'end', 'duration')
+  dayFields = ('day', 'start', 'end', 'workTime', 'lunchTime')
+
+  def __init__(self, format='csv', formatter=None):
+    if format not in TimesheetExporter.formats:
+      raise ValueError('unknown export format: ' + str(format))
+    self.format = format
+    self.formatter = formatter if formatter is not None else TimeFormatter('hms', False)
+
+  def formatTime(self, epoch):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(epoch)) if epoch is not None else None
+
+  def taskRows(self, intervals):
+    for name, start, end in intervals:
+      if name is None:
+        continue
+      yield {'task' : name, 'start' : self.formatTime(start), 'end' : self.formatTime(end), 'duration' : self.formatter.get(end - start)}, (name, start, end)
+
+  def dayRows(self, reports):
+    for report in reports:
+      row = {'day' : report.day.isoformat(), 'start' : self.formatTime(report.start), 'end' : self.formatTime(report.end),
+             'workTime' : self.formatter.get(report.workTime.total_seconds()), 'lunchTime' : self.formatter.get(report.lunchTime.total_seconds())}
+      yield row, ('Work', report.start, report.end)
+
+  def exportTimes(self, intervals, target):
+    return self.write(self.taskRows(intervals), self.taskFields, target)
+
+  def exportDays(self, reports, target):
+    return self.write(self.dayRows(reports), self.dayFields, target)
+
+  def write(self, rows, fields, target):
+    count = 0
+    if self.format == 'csv':
+      writer = csv.DictWriter(target, fields, lineterminator='\n')
+      writer.writeheader()
+      for row, event in rows:
+        writer.writerow(row)
+        count += 1
+    elif self.format == 'jsonl':
+      for row, event in rows:
+        target.write(json.dumps(row) + '\n')
+        count += 1
+    else:
+      target.write('BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//TaskTimer//Timesheet//EN\r\n')
+      stamp = self.formatUtc(time.time())
+      for row, event in rows:
+        if event[1] is not None and event[2] is not None:
+          target.write(self.formatEvent(event, stamp))
+          count += 1
+      target.write('END:VCALENDAR\r\n')
+    return count
+
+  def formatUtc(self, epoch):
+    return datetime.datetime.fromtimestamp(epoch, datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+  def formatEvent(self, event, stamp):
+    summary, start, end = event
+    summary = summary.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+    return ('BEGIN:VEVENT\r\nUID:%s-%08x@tasktimer\r\nDTSTAMP:%s\r\nDTSTART:%s\r\nDTEND:%s\r\n%sEND:VEVENT\r\n' %
+      (self.formatUtc(start), zlib.crc32(summary.encode()), stamp, self.formatUtc(start), self.formatUtc(end), self.foldLine('SUMMARY:' + summary)))
+
+  def foldLine(self, line):
+    lines = []
+    current = ''
+    size = 0
+    for char in line:
+      length = len(char.encode())
+      if size + length > 75:
+        lines.append(current)
+        current, size = ' ', 1
+      current += char
+      size += length
+    lines.append(current)
+    return '\r\n'.join(lines) + '\r\n'
@@ -0,0 +1,52 @@
+import os
+
+
+class DataFile(object):
+  def __init__(self, fileName):
+    self.fileName = fileName
+
+  def forLoad(self, binary=False):
+    try:
+      return open(self.fileName, 'rb' if binary else 'r')
+    except:
+      return None
+
+  def forSave(self, newline=None):
+    return ReplacingFile(self.fileName, newline)
+
+  def forAppend(self, binary=False):
+    return open(self.fileName, 'ab' if binary else 'a')
+
+
+class ReplacingFile(object):
+  def __init__(self, fileName, newline=None):
+    self.fileName = fileName
+    self.newline = newline
+    self.target = None
+
+  def getTarget(self):
+    if self.target is None:
+      self.target = open(self.fileName + '.tmp', 'w', newline=self.newline)
+    return self.target
+
+  def write(self, data):
+    return self.getTarget().write(data)
+
+  def tell(self):
+    return self.getTarget().tell()
+
+  def close(self):
+    target = self.getTarget()
+    if not target.closed:
+      target.close()
+      os.replace(self.fileName + '.tmp', self.fileName)
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, excType, excValue, traceback):
+    if excType is None:
+      self.close()
+    elif self.target is not None:
+      self.target.close()
+      os.remove(self.fileName + '.tmp')
@@ -0,0 +1,38 @@
+class TimeFormatter(object):
+  def __init__(self, format, trimZeros):
+    self.units = []
+    self.order = []
+    self.trimZeros = trimZeros
+    for unit in (('d', 8 * 3600), ('h', 3600), ('m', 60), ('s', 1)):
+      index = format.find(unit[0])
+      if index >= 0:
+        self.units.append(unit)
+        self.order.append(index)
+
+  def round(self, value):
+    divisor = self.units[-1][1]
+    return value if value % divisor == 0 else (int(value / divisor) + 1) * divisor
+
+  def split(self, value):
+    values = []
+    for unit in self.units:
+      unitValue = int(value / unit[1])
+      value -= unitValue * unit[1]
+      values.append((unitValue, unit[0]))
+    return values
+
+  def trim(self, values):
+    first = -1 if self.trimZeros else 0
+    last = len(values)
+    for item in enumerate(values):
+      if item[1][0] > 0:
+        if first < 0:
+          first = item[0]
+        if self.trimZeros:
+          last = item[0] + 1
+    return values[first:last], first
+
+  def get(self, timeValue):
+    values, offset = self.trim(self.split(self.round(timeValue)))
+    sortedValues = sorted(zip(self.order[offset:], values), key=lambda item : item[0])
+    return ' '.join(str(item[1][0]) + item[1][1] for item in sortedValues)
@@ -0,0 +1,25 @@
+class PresenceSource(object):
+  def __init__(self):
+    self.locked = False
+
+  def isLocked(self):
+    return self.locked
+
+  def setLocked(self, locked):
+    self.locked = locked
+
+  def close(self):
+    pass
+
+
+class FakePresenceSource(PresenceSource):
+  def __init__(self, states=()):
+    super().__init__()
+    self.states = list(states)
+    self.calls = 0
+
+  def isLocked(self):
+    self.calls += 1
+    if len(self.states) > 0:
+      self.locked = self.states.pop(0)
+    return self.locked
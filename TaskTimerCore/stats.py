@@ -0,0 +1,101 @@
+import time
+import json
+import bisect
+import sqlite3
+import threading
+
+
+class Histogram(object):
+  bounds = (0.0001, 0.0003, 0.001, 0.003, 0.01, 0.03, 0.1, 0.3, 1.0, 3.0)
+
+  def __init__(self):
+    self.counts = [0] * (len(Histogram.bounds) + 1)
+    self.count = 0
+    self.total = 0.0
+    self.max = 0.0
+
+  def add(self, value):
+    self.counts[bisect.bisect_left(Histogram.bounds, value)] += 1
+    self.count += 1
+    self.total += value
+    self.max = max(self.max, value)
+
+  def toDict(self):
+    labels = ['<=' + str(bound) for bound in Histogram.bounds] + ['>' + str(Histogram.bounds[-1])]
+    return {'count' : self.count, 'total' : self.total, 'mean' : self.total / self.count if self.count > 0 else 0.0, 'max' : self.max,
+            'buckets' : {label : count for label, count in zip(labels, self.counts) if count > 0}}
+
+
+class Stats(object):
+  def __init__(self):
+    self.histograms = {}
+    self.counters = {}
+    self.lock = threading.Lock()
+
+  def record(self, name, value):
+    with self.lock:
+      histogram = self.histograms.get(name)
+      if histogram is None:
+        histogram = self.histograms[name] = Histogram()
+      histogram.add(value)
+
+  def count(self, name, value=1):
+    with self.lock:
+      self.counters[name] = self.counters.get(name, 0) + value
+
+  def toDict(self):
+    with self.lock:
+      return {'histograms' : {name : histogram.toDict() for name, histogram in sorted(self.histograms.items())},
+              'counters' : dict(sorted(self.counters.items()))}
+
+  def save(self, dataFile):
+    with dataFile.forSave() as target:
+      json.dump(self.toDict(), target, indent=1)
+
+
+class TimedCursor(sqlite3.Cursor):
+  def execute(self, sql, parameters=()):
+    self.query = ' '.join(sql.split())[:120]
+    start = time.perf_counter()
+    try:
+      return super().execute(sql, parameters)
+    finally:
+      self.connection.stats.record('query ' + self.query, time.perf_counter() - start)
+
+  def executemany(self, sql, parameters):
+    self.query = ' '.join(sql.split())[:120]
+    start = time.perf_counter()
+    try:
+      return super().executemany(sql, parameters)
+    finally:
+      self.connection.stats.record('query ' + self.query, time.perf_counter() - start)
+      self.connection.stats.count('rows ' + self.query, max(self.rowcount, 0))
+
+  def fetchone(self):
+    row = super().fetchone()
+    if row is not None:
+      self.connection.stats.count('rows ' + self.query)
+    return row
+
+  def fetchall(self):
+    rows = super().fetchall()
+    self.connection.stats.count('rows ' + self.query, len(rows))
+    return rows
+
+  def __next__(self):
+    row = super().__next__()
+    self.connection.stats.count('rows ' + self.query)
+    return row
+
+
+class TimedConnection(sqlite3.Connection):
+  stats = None
+
+  def cursor(self, factory=TimedCursor):
+    return super().cursor(factory)
+
+  def execute(self, sql, parameters=()):
+    return self.cursor().execute(sql, parameters)
+
+  def executemany(self, sql, parameters):
+    return self.cursor().executemany(sql, parameters)
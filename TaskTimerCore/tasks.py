@@ -0,0 +1,740 @@
+import time
+import json
+import datetime
+import os
+import sys
+import array
+import mmap
+import bisect
+import struct
+from .writer import DirectWriter
+from .aggregate import TaskAggregator
+
+
+class TaskState(object):
+  __slots__ = ('name', 'reportedTime', 'active')
+
+  def __init__(self, data):
+    if isinstance(data, dict):
+      self.name = sys.intern(data['name'])
+      self.reportedTime = data['reportedTime']
+      self.active = data['active']
+    else:
+      self.name = data
+      self.reportedTime = 0.0
+      self.active = True
+
+  def toDict(self):
+    return {'name' : self.name, 'reportedTime' : self.reportedTime, 'active' : self.active}
+
+
+class TaskTime(object):
+  __slots__ = ('name', 'epoch')
+  timeProvider = time.localtime
+  compactFormat = False
+
+  def __init__(self, data):
+    if isinstance(data, dict):
+      self.name = sys.intern(data['name']) if data['name'] is not None else None
+      if isinstance(data['time'], list):
+        self.epoch = time.mktime(time.struct_time(tuple(data['time'])))
+      else:
+        self.epoch = float(data['time'])
+    else:
+      self.name = data
+      self.epoch = time.mktime(TaskTime.timeProvider())
+
+  @classmethod
+  def at(cls, name, epoch):
+    item = cls.__new__(cls)
+    item.name = name
+    item.epoch = epoch
+    return item
+
+  @property
+  def time(self):
+    return time.localtime(self.epoch)
+
+  def getTime(self):
+    return self.epoch
+
+  def toDict(self):
+    return {'name' : self.name, 'time' : self.epoch if TaskTime.compactFormat else list(self.time)}
+
+
+class TasksData(object):
+  stats = None
+
+  def __init__(self, dataFile=None, journal=None, timesFile=None, writer=None, resume=True, readOnly=False):
+    if timesFile is not None and journal is None:
+      raise ValueError('a binary times file needs a journal to record task names')
+    self.keepTimingWhenOff = False
+    self.writer = writer if writer is not None else DirectWriter()
+    self.journal = None
+    self.binaryTimes = False
+    self.days = {}
+    sequence = 0
+    if dataFile is None:
+      self.tasks = []
+      self.times = []
+    else:
+      sequence = self.load(dataFile)
+    if journal is not None:
+      self.replay(journal, sequence)
+    if timesFile is not None:
+      self.loadTimesStore(timesFile, journal.writer, readOnly)
+    self.journal = journal
+    if resume and (dataFile is not None or journal is not None or timesFile is not None):
+      self.continueLastTask()
+
+  @property
+  def tasks(self):
+    return self.taskList
+
+  @tasks.setter
+  def tasks(self, tasks):
+    self.taskList = tasks
+    self.taskIndex = {}
+    self.taskIds = {}
+    for taskId in range(len(tasks) - 1, -1, -1):
+      self.taskIndex[tasks[taskId].name] = tasks[taskId]
+      self.taskIds[tasks[taskId].name] = taskId
+
+  @property
+  def times(self):
+    return self.timeList
+
+  @times.setter
+  def times(self, times):
+    self.timeList = times
+    if isinstance(times, TimesStore):
+      self.index = TimesIndex(epoch for taskId, epoch in times.items())
+      self.taskTotals = times.getTaskTotals()
+      return
+    self.index = TimesIndex(item.getTime() for item in times)
+    self.taskTotals = {}
+    for (day, name), seconds in self.days.items():
+      self.taskTotals[name] = self.taskTotals.get(name, 0.0) + seconds
+    previous = None
+    for current in times:
+      if previous is not None:
+        self.addTaskTotal(previous, current)
+      previous = current
+
+  def load(self, dataFile):
+    start = time.perf_counter()
+    with dataFile as source:
+      data = json.load(source)
+      self.tasks = [TaskState(item) for item in data['tasks']]
+      self.days = {(day, name) : seconds for day, name, seconds in data.get('days', [])}
+      self.times = [self.loadTime(item) for item in data['times']]
+      if TasksData.stats is not None:
+        TasksData.stats.record('tasks.load', time.perf_counter() - start)
+        TasksData.stats.count('tasks.load.bytes', source.tell())
+      return data.get('journal', 0)
+
+  def loadTimesStore(self, timesFile, writer=None, readOnly=False):
+    store = TimesStore(self, timesFile, writer, readOnly)
+    if len(store) == 0:
+      for item in self.times:
+        self.register(item.name)
+        store.append(item)
+    self.times = store
+    self.binaryTimes = True
+
+  def addTaskTotal(self, previous, current):
+    self.taskTotals[previous.name] = self.taskTotals.get(previous.name, 0.0) + current.getTime() - previous.getTime()
+
+  def replay(self, journal, sequence):
+    journal.sequence = sequence
+    for record in journal.load():
+      if record['seq'] <= sequence:
+        continue
+      if record['op'] == 'add':
+        self.append(TaskTime(record))
+      elif record['op'] == 'task':
+        self.register(record['name'])
+      elif record['op'] == 'remove':
+        self.remove(record['name'])
+      elif record['op'] == 'report':
+        self.updateTaskTime(record['name'], record['time'])
+      elif record['op'] == 'reassign':
+        self.reassign(record['start'], record['end'], record['name'])
+
+  def record(self, data):
+    if self.journal is not None:
+      self.journal.write(data)
+
+  def needsSnapshot(self):
+    return self.journal is None or self.journal.records >= TasksJournal.compactLimit
+
+  def save(self, dataFile):
+    if self.keepTimingWhenOff:
+      self.keepTimingWhenOff = False
+    else:
+      self.add(None)
+    if dataFile is not None:
+      times = [] if self.binaryTimes else [self.saveTime(item) for item in self.times]
+      data = { 'tasks' : [item.toDict() for item in self.tasks], 'times' : times }
+      if len(self.days) > 0:
+        data['days'] = [[day, name, seconds] for (day, name), seconds in sorted(self.days.items(), key=lambda item : (item[0][0], item[0][1] or ''))]
+      if self.journal is not None:
+        data['journal'] = self.journal.sequence
+      self.writer.submit(lambda dataConn: self.writeSnapshot(data, dataFile))
+      if self.journal is not None:
+        self.journal.clear()
+
+  def writeSnapshot(self, data, dataFile):
+    start = time.perf_counter()
+    with dataFile as target:
+      json.dump(data, target)
+      if TasksData.stats is not None:
+        TasksData.stats.count('tasks.save.bytes', target.tell())
+    if TasksData.stats is not None:
+      TasksData.stats.record('tasks.save', time.perf_counter() - start)
+
+  def rollup(self, before, archiveFile):
+    if self.binaryTimes:
+      raise ValueError('rollup needs the times list, not a binary times store')
+    boundary = time.mktime((before.year, before.month, before.day, 0, 0, 0, 0, 0, -1))
+    keep = len(self.times) - 1
+    while keep > 0 and self.times[keep].name is None:
+      keep -= 1
+    cut = 0
+    while cut < keep and self.times[cut].getTime() < boundary:
+      cut += 1
+    if cut == 0:
+      return 0
+    with archiveFile.forAppend() as target:
+      for index in range(cut):
+        target.write(json.dumps(self.times[index].toDict()) + '\n')
+        for day, seconds in self.splitInterval(self.times[index].getTime(), self.times[index + 1].getTime()):
+          key = (day, self.times[index].name)
+          self.days[key] = self.days.get(key, 0.0) + seconds
+    self.timeList = self.times[cut:]
+    self.index.replace(0, cut, ())
+    return cut
+
+  def splitInterval(self, start, end):
+    while start < end:
+      day = datetime.date.fromtimestamp(start)
+      nextDay = day + datetime.timedelta(days=1)
+      dayEnd = min(end, time.mktime((nextDay.year, nextDay.month, nextDay.day, 0, 0, 0, 0, 0, -1)))
+      yield day.isoformat(), dayEnd - start
+      start = dayEnd
+
+  def close(self):
+    if self.journal is not None:
+      self.journal.close()
+    if self.binaryTimes:
+      self.times.close()
+
+  def loadTime(self, data):
+    if isinstance(data, list):
+      return TaskTime.at(self.tasks[data[0]].name if data[0] is not None else None, data[1])
+    return TaskTime(data)
+
+  def saveTime(self, item):
+    if TaskTime.compactFormat and (item.name is None or item.name in self.taskIds):
+      return [self.taskIds.get(item.name), item.epoch]
+    return item.toDict()
+
+  def find(self, task):
+    return self.taskIndex.get(task)
+
+  def add(self, task):
+    self.append(TaskTime(task))
+
+  def register(self, task):
+    if task is not None and self.find(task) is None:
+      item = TaskState(task)
+      self.taskIds[task] = len(self.tasks)
+      self.tasks.append(item)
+      self.taskIndex[task] = item
+      if self.binaryTimes:
+        self.record({'op' : 'task', 'name' : task})
+
+  def append(self, current):
+    self.register(current.name)
+    if len(self.times) > 0:
+      self.addTaskTotal(self.times[-1], current)
+    self.times.append(current)
+    self.index.append(current.epoch)
+    if self.journal is not None and not self.binaryTimes:
+      record = current.toDict()
+      record['op'] = 'add'
+      self.record(record)
+
+  def remove(self, task):
+    item = self.find(task)
+    if item is not None:
+      item.active = False
+      self.record({'op' : 'remove', 'name' : task})
+
+  def getLastTask(self):
+    for index in range(len(self.times) - 1, -1, -1):
+      if self.times[index].name is not None:
+        item = self.find(self.times[index].name)
+        if item is not None and item.active:
+          return item.name
+        break
+    return ''
+
+  def continueLastTask(self):
+    lastTask = self.getLastTask()
+    if lastTask != '' and self.times[-1].name is None:
+      self.add(lastTask)
+
+  def getActiveTasks(self):
+    return [item.name for item in self.tasks if item.active]
+
+  def getTaskTime(self, task):
+    item = self.find(task)
+    sumTime = -item.reportedTime if item is not None else 0.0
+    return sumTime + self.taskTotals.get(task, 0.0)
+
+  def getTaskTimeTillNow(self, task):
+    sumTime = self.getTaskTime(task)
+    if len(self.times) > 0 and self.times[-1].name == task:
+      sumTime += time.time() - self.times[-1].getTime()
+    return sumTime
+
+  def updateTaskTime(self, task, time):
+    item = self.find(task)
+    if item is not None:
+      item.reportedTime += time
+      self.record({'op' : 'report', 'name' : task, 'time' : time})
+
+  def getPeriodTaskTimes(self, period='day', end=None):
+    return TaskAggregator(period).aggregate(self.times, end, self.getSummaryDays())
+
+  def getSummaryDays(self):
+    return self.days.items()
+
+  def getTaskAt(self, epoch):
+    index = self.index.find(epoch)
+    return self.times[index].name if index >= 0 else None
+
+  def getOverlappingTimes(self, start, end):
+    return list(self.iterTimes(start, end))
+
+  def iterTimes(self, start=None, end=None, task=None):
+    first = max(self.index.find(start), 0) if start is not None else 0
+    now = time.time() if end is None else end
+    for index in range(first, len(self.index)):
+      epoch = self.index.epochs[index]
+      if end is not None and epoch >= end:
+        break
+      name = self.times[index].name
+      if task is not None and name != task:
+        continue
+      intervalEnd = self.index.epochs[index + 1] if index + 1 < len(self.index) else now
+      yield name, max(start, epoch) if start is not None else epoch, min(end, intervalEnd) if end is not None else intervalEnd
+
+  def reassign(self, start, end, task):
+    if self.binaryTimes:
+      raise ValueError('reassign needs the times list, not a binary times store')
+    if start >= end or len(self.times) == 0 or end > self.times[-1].getTime():
+      raise ValueError('only a past interval can be reassigned')
+    self.register(task)
+    first = bisect.bisect_left(self.index.epochs, start)
+    last = bisect.bisect_left(self.index.epochs, end)
+    replacement = [TaskTime.at(task, start)]
+    if self.times[last].getTime() != end:
+      replacement.append(TaskTime.at(self.times[last - 1].name if last > 0 else None, end))
+    low = max(first - 1, 0)
+    self.changeTaskTotals(low, last, -1.0)
+    self.times[first:last] = replacement
+    self.index.replace(first, last, [item.epoch for item in replacement])
+    self.changeTaskTotals(low, first + len(replacement), 1.0)
+    self.record({'op' : 'reassign', 'name' : task, 'start' : start, 'end' : end})
+
+  def changeTaskTotals(self, first, last, sign):
+    for index in range(first, last):
+      name = self.times[index].name
+      self.taskTotals[name] = self.taskTotals.get(name, 0.0) + sign * (self.times[index + 1].getTime() - self.times[index].getTime())
+
+
+class TasksDb(TasksData):
+  def __init__(self, db, dataFile=None, resume=True):
+    self.keepTimingWhenOff = False
+    self.journal = None
+    self.binaryTimes = False
+    self.dataConn = db.dataConn
+    self.writer = db.writer
+    self.transaction = db.transaction
+    self.dataVersion = None
+    self.syncExternalWrites()
+    if len(self.tasks) == 0 and self.lastSwitch is None and dataFile is not None:
+      imported = TasksData()
+      imported.load(dataFile)
+      self.importData(imported)
+    elif dataFile is not None:
+      dataFile.close()
+    if resume:
+      self.continueLastTask()
+
+  @property
+  def times(self):
+    self.syncExternalWrites()
+    return [TaskTime.at(row[0], row[1]) for row in self.dataConn.execute('''SELECT Task.name, TaskSwitch.epoch FROM TaskSwitch
+      LEFT JOIN Task ON Task.id = TaskSwitch.taskId ORDER BY TaskSwitch.epoch, TaskSwitch.rowid''')]
+
+  @property
+  def days(self):
+    return dict(self.getSummaryDays())
+
+  @property
+  def index(self):
+    return TimesIndex(item.epoch for item in self.times)
+
+  def getDay(self, epoch):
+    return time.strftime('%Y-%m-%d', time.localtime(epoch))
+
+  def syncExternalWrites(self):
+    self.writer.flush()
+    dataVersion = self.dataConn.execute('PRAGMA data_version').fetchone()[0]
+    if dataVersion != self.dataVersion:
+      self.dataVersion = dataVersion
+      self.loadTasks()
+      self.loadLastSwitch()
+
+  def importData(self, source):
+    curs = self.dataConn.cursor()
+    self.tasks = list(source.tasks)
+    times = source.times
+    for item in times:
+      TasksData.register(self, item.name)
+    for day, name in source.days:
+      TasksData.register(self, name)
+    curs.executemany('INSERT INTO Task(id, name, reportedTime, active) VALUES(?, ?, ?, ?)',
+      ((taskId, item.name, item.reportedTime, item.active) for taskId, item in enumerate(self.tasks)))
+    curs.executemany('INSERT INTO TaskDaySummary(day, taskId, seconds) VALUES(?, ?, ?)',
+      ((day, self.taskIds.get(name), seconds) for (day, name), seconds in source.days.items()))
+    curs.executemany('INSERT INTO TaskSwitch(taskId, epoch, endEpoch, day) VALUES(?, ?, ?, ?)',
+      ((self.taskIds.get(item.name), item.epoch, times[index + 1].epoch if index + 1 < len(times) else None, self.getDay(item.epoch))
+        for index, item in enumerate(times)))
+    self.dataConn.commit()
+    self.loadLastSwitch()
+
+  def loadTasks(self):
+    self.tasks = [TaskState({'name' : row[0], 'reportedTime' : row[1], 'active' : bool(row[2])})
+      for row in self.dataConn.execute('SELECT name, reportedTime, active FROM Task ORDER BY id')]
+
+  def loadLastSwitch(self):
+    curs = self.dataConn.cursor()
+    self.lastSwitch = curs.execute('''SELECT Task.name, TaskSwitch.epoch FROM TaskSwitch LEFT JOIN Task ON Task.id = TaskSwitch.taskId
+      ORDER BY TaskSwitch.epoch DESC, TaskSwitch.rowid DESC LIMIT 1''').fetchone()
+    lastTask = curs.execute('''SELECT Task.name FROM TaskSwitch JOIN Task ON Task.id = TaskSwitch.taskId
+      ORDER BY TaskSwitch.epoch DESC, TaskSwitch.rowid DESC LIMIT 1''').fetchone()
+    self.lastTask = lastTask[0] if lastTask is not None else None
+
+  def register(self, task):
+    if task is not None and self.find(task) is None:
+      super().register(task)
+      self.writer.submit(lambda dataConn: self.writeTask(task, dataConn))
+
+  def writeTask(self, task, dataConn):
+    dataConn.execute('INSERT INTO Task(name, reportedTime, active) SELECT :name, 0.0, 1 WHERE NOT EXISTS (SELECT 1 FROM Task WHERE name = :name)',
+      {'name' : task})
+
+  def saveTask(self, task):
+    item = self.find(task)
+    if item is not None:
+      row = (item.reportedTime, item.active, task)
+      self.writer.submit(lambda dataConn: dataConn.execute('UPDATE Task SET reportedTime = ?, active = ? WHERE name = ?', row))
+
+  def append(self, current):
+    self.register(current.name)
+    self.lastSwitch = (current.name, current.epoch)
+    if current.name is not None:
+      self.lastTask = current.name
+    switch = {'name' : current.name, 'epoch' : current.epoch, 'day' : self.getDay(current.epoch)}
+    self.writer.submit(lambda dataConn: self.writeSwitch(switch, dataConn))
+
+  def getTaskAt(self, epoch):
+    self.syncExternalWrites()
+    row = self.dataConn.execute('''SELECT Task.name FROM TaskSwitch LEFT JOIN Task ON Task.id = TaskSwitch.taskId
+      WHERE TaskSwitch.epoch <= ? ORDER BY TaskSwitch.epoch DESC, TaskSwitch.rowid DESC LIMIT 1''', (epoch,)).fetchone()
+    return row[0] if row is not None else None
+
+  def iterTimes(self, start=None, end=None, task=None):
+    conditions = []
+    if start is not None:
+      conditions.append('epoch >= IFNULL((SELECT MAX(epoch) FROM TaskSwitch WHERE epoch <= :start), :start)')
+    if end is not None:
+      conditions.append('epoch < :end')
+    self.syncExternalWrites()
+    if task is not None:
+      if self.find(task) is None:
+        return
+      conditions.append('taskId IS (SELECT id FROM Task WHERE name = :name)')
+    now = time.time() if end is None else end
+    query = 'SELECT taskId, epoch, endEpoch FROM TaskSwitch' + ''.join((' AND ' if index > 0 else ' WHERE ') + item for index, item in enumerate(conditions))
+    query = 'SELECT Task.name, Switch.epoch, Switch.endEpoch FROM (' + query + ' ORDER BY epoch, rowid) AS Switch LEFT JOIN Task ON Task.id = Switch.taskId'
+    for name, epoch, endEpoch in self.dataConn.execute(query, {'start' : start, 'end' : end, 'name' : task}):
+      endEpoch = endEpoch if endEpoch is not None else now
+      yield name, max(start, epoch) if start is not None else epoch, min(end, endEpoch) if end is not None else endEpoch
+
+  def reassign(self, start, end, task):
+    self.syncExternalWrites()
+    if start >= end or self.lastSwitch is None or end > self.lastSwitch[1]:
+      raise ValueError('only a past interval can be reassigned')
+    self.register(task)
+    switch = (task, start, end, self.getDay(start), self.getDay(end))
+    self.writer.submit(lambda dataConn: self.writeReassign(switch, dataConn))
+
+  def writeReassign(self, switch, dataConn):
+    task, start, end, startDay, endDay = switch
+    nextEpoch = dataConn.execute('SELECT MIN(epoch) FROM TaskSwitch WHERE epoch >= ?', (end,)).fetchone()[0]
+    restore = dataConn.execute('SELECT taskId FROM TaskSwitch WHERE epoch < ? ORDER BY epoch DESC, rowid DESC LIMIT 1', (end,)).fetchone()
+    dataConn.execute('DELETE FROM TaskSwitch WHERE epoch >= ? AND epoch < ?', (start, end))
+    dataConn.execute('UPDATE TaskSwitch SET endEpoch = ? WHERE epoch < ? AND endEpoch > ?', (start, start, start))
+    dataConn.execute('INSERT INTO TaskSwitch(taskId, epoch, endEpoch, day) VALUES((SELECT id FROM Task WHERE name = ?), ?, ?, ?)', (task, start, end, startDay))
+    if nextEpoch != end:
+      dataConn.execute('INSERT INTO TaskSwitch(taskId, epoch, endEpoch, day) VALUES(?, ?, ?, ?)',
+        (restore[0] if restore is not None else None, end, nextEpoch, endDay))
+
+  def writeSwitch(self, switch, dataConn):
+    dataConn.execute('UPDATE TaskSwitch SET endEpoch = :epoch WHERE endEpoch IS NULL AND epoch <= :epoch', switch)
+    dataConn.execute('INSERT INTO TaskSwitch(taskId, epoch, day) VALUES((SELECT id FROM Task WHERE name = :name), :epoch, :day)', switch)
+
+  def remove(self, task):
+    super().remove(task)
+    self.saveTask(task)
+
+  def updateTaskTime(self, task, time):
+    super().updateTaskTime(task, time)
+    self.saveTask(task)
+
+  def needsSnapshot(self):
+    return False
+
+  def getActiveTasks(self):
+    self.syncExternalWrites()
+    return super().getActiveTasks()
+
+  def getLastTask(self):
+    self.syncExternalWrites()
+    item = self.find(self.lastTask)
+    if item is not None and item.active:
+      return item.name
+    return ''
+
+  def continueLastTask(self):
+    lastTask = self.getLastTask()
+    if lastTask != '' and self.lastSwitch[0] is None:
+      self.add(lastTask)
+
+  def getTaskTime(self, task):
+    self.syncExternalWrites()
+    item = self.find(task)
+    if task is not None and item is None:
+      return 0.0
+    sumTime = -item.reportedTime if item is not None else 0.0
+    return sumTime + self.dataConn.execute('''SELECT TOTAL(endEpoch - epoch) + (SELECT TOTAL(seconds) FROM TaskDaySummary WHERE taskId IS (SELECT id FROM Task WHERE name = :name))
+      FROM TaskSwitch WHERE taskId IS (SELECT id FROM Task WHERE name = :name) AND endEpoch IS NOT NULL''', {'name' : task}).fetchone()[0]
+
+  def getTaskTimeTillNow(self, task):
+    sumTime = self.getTaskTime(task)
+    if self.lastSwitch is not None and self.lastSwitch[0] == task:
+      sumTime += time.time() - self.lastSwitch[1]
+    return sumTime
+
+  def getDayTaskTimes(self, day):
+    self.syncExternalWrites()
+    return {row[0] : row[1] for row in self.dataConn.execute('''SELECT Task.name, TOTAL(seconds) FROM (
+      SELECT taskId, endEpoch - epoch AS seconds FROM TaskSwitch WHERE day = :day AND endEpoch IS NOT NULL
+      UNION ALL SELECT taskId, seconds FROM TaskDaySummary WHERE day = :day) AS Day LEFT JOIN Task ON Task.id = Day.taskId GROUP BY Day.taskId''',
+      {'day' : day.isoformat()})}
+
+  def getSummaryDays(self):
+    self.syncExternalWrites()
+    return [((row[0], row[1]), row[2]) for row in self.dataConn.execute('''SELECT TaskDaySummary.day, Task.name, TaskDaySummary.seconds
+      FROM TaskDaySummary LEFT JOIN Task ON Task.id = TaskDaySummary.taskId''')]
+
+  def rollup(self, before):
+    bounds = {'before' : before.isoformat()}
+    with self.transaction as dataConn:
+      dataConn.execute('''INSERT INTO TaskDaySummary(day, taskId, seconds)
+        SELECT day, taskId, TOTAL(endEpoch - epoch) FROM TaskSwitch WHERE day < :before AND endEpoch IS NOT NULL GROUP BY day, taskId
+        ON CONFLICT(day, taskId) DO UPDATE SET seconds = seconds + excluded.seconds''', bounds)
+      dataConn.execute('''INSERT INTO TaskSwitchArchive(taskId, epoch, endEpoch, day)
+        SELECT taskId, epoch, endEpoch, day FROM TaskSwitch WHERE day < :before AND endEpoch IS NOT NULL ORDER BY epoch, rowid''', bounds)
+      return dataConn.execute('DELETE FROM TaskSwitch WHERE day < :before AND endEpoch IS NOT NULL', bounds).rowcount
+
+
+class TimesStore(object):
+  record = struct.Struct('<di4x')
+
+  def __init__(self, tasksData, dataFile, writer=None, readOnly=False):
+    self.tasksData = tasksData
+    self.writer = writer if writer is not None else DirectWriter()
+    self.source = None
+    self.buffer = None
+    self.baseEpochs = memoryview(array.array('d'))
+    self.baseIds = memoryview(array.array('i'))
+    self.epochs = array.array('d')
+    self.ids = array.array('i')
+    self.target = None if readOnly else dataFile.forAppend(True)
+    self.source = dataFile.forLoad(True)
+    size = self.source.seek(0, os.SEEK_END) if self.source is not None else 0
+    count = size // TimesStore.record.size
+    if size != count * TimesStore.record.size:
+      self.truncate(count)
+    if count > 0:
+      self.mapRecords(count)
+      limit = len(tasksData.tasks)
+      valid = next((index for index, taskId in enumerate(self.baseIds) if taskId >= limit), count)
+      if valid < count:
+        self.unmapRecords()
+        self.truncate(valid)
+        self.mapRecords(valid)
+
+  def truncate(self, count):
+    if self.target is not None:
+      self.target.truncate(count * TimesStore.record.size)
+      self.target.seek(0, os.SEEK_END)
+
+  def mapRecords(self, count):
+    self.buffer = None
+    self.baseEpochs = memoryview(array.array('d'))
+    self.baseIds = memoryview(array.array('i'))
+    if count > 0:
+      self.buffer = mmap.mmap(self.source.fileno(), count * TimesStore.record.size, access=mmap.ACCESS_READ)
+      view = memoryview(self.buffer)
+      self.baseEpochs = view.cast('d')[0::2]
+      self.baseIds = view.cast('i')[2::4]
+
+  def unmapRecords(self):
+    if self.buffer is not None:
+      self.baseEpochs.release()
+      self.baseIds.release()
+      self.buffer.close()
+
+  def __len__(self):
+    return len(self.baseIds) + len(self.ids)
+
+  def __getitem__(self, index):
+    if isinstance(index, slice):
+      return [self[item] for item in range(*index.indices(len(self)))]
+    if index < 0:
+      index += len(self)
+    if index < 0 or index >= len(self):
+      raise IndexError('times index out of range')
+    if index < len(self.baseIds):
+      return TaskTime.at(self.getName(self.baseIds[index]), self.baseEpochs[index])
+    index -= len(self.baseIds)
+    return TaskTime.at(self.getName(self.ids[index]), self.epochs[index])
+
+  def __iter__(self):
+    for taskId, epoch in self.items():
+      yield TaskTime.at(self.getName(taskId), epoch)
+
+  def items(self):
+    yield from zip(self.baseIds, self.baseEpochs)
+    yield from zip(self.ids, self.epochs)
+
+  def getName(self, taskId):
+    return self.tasksData.tasks[taskId].name if taskId >= 0 else None
+
+  def append(self, taskTime):
+    taskId = self.tasksData.taskIds[taskTime.name] if taskTime.name is not None else -1
+    if self.target is not None:
+      data = TimesStore.record.pack(taskTime.epoch, taskId)
+      self.writer.submit(lambda dataConn: self.writeRecord(data))
+    self.ids.append(taskId)
+    self.epochs.append(taskTime.epoch)
+
+  def writeRecord(self, data):
+    self.target.write(data)
+    self.target.flush()
+
+  def getTaskTotals(self):
+    totals = {}
+    previousId = None
+    for taskId, epoch in self.items():
+      if previousId is not None:
+        totals[previousId] = totals.get(previousId, 0.0) + epoch - previousEpoch
+      previousId, previousEpoch = taskId, epoch
+    return {self.getName(taskId) : total for taskId, total in totals.items()}
+
+  def close(self):
+    if self.target is not None:
+      self.target.close()
+    self.unmapRecords()
+    if self.source is not None:
+      self.source.close()
+
+
+class TimesIndex(object):
+  def __init__(self, epochs=()):
+    self.epochs = array.array('d', epochs)
+
+  def __len__(self):
+    return len(self.epochs)
+
+  def append(self, epoch):
+    self.epochs.append(epoch)
+
+  def replace(self, first, last, epochs):
+    self.epochs[first:last] = array.array('d', epochs)
+
+  def find(self, epoch):
+    return bisect.bisect_right(self.epochs, epoch) - 1
+
+
+class TasksJournal(object):
+  compactLimit = 1000
+
+  def __init__(self, dataFile, writer=None):
+    self.dataFile = dataFile
+    self.writer = writer if writer is not None else DirectWriter()
+    self.target = None
+    self.records = 0
+    self.sequence = 0
+    self.torn = False
+
+  def load(self):
+    source = self.dataFile.forLoad()
+    if source is None:
+      return
+    with source:
+      for line in source:
+        self.torn = not line.endswith('\n')
+        try:
+          record = json.loads(line)
+        except ValueError:
+          continue
+        self.records += 1
+        self.sequence = max(self.sequence, record['seq'])
+        yield record
+
+  def write(self, data):
+    self.sequence += 1
+    data['seq'] = self.sequence
+    self.records += 1
+    line = json.dumps(data)
+    self.writer.submit(lambda dataConn: self.writeLine(line))
+
+  def writeLine(self, line):
+    if self.target is None:
+      self.target = self.dataFile.forAppend()
+    self.target.write(('\n' if self.torn else '') + line + '\n')
+    self.target.flush()
+    self.torn = False
+
+  def clear(self):
+    self.records = 0
+    self.writer.submit(lambda dataConn: self.truncate())
+
+  def truncate(self):
+    self.close()
+    with self.dataFile.forSave():
+      pass
+    self.torn = False
+
+  def close(self):
+    if self.target is not None:
+      self.target.close()
+      self.target = None
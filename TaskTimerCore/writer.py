@@ -0,0 +1,106 @@
+import queue
+import threading
+
+
+class Transaction(object):
+  def __init__(self, dataConn):
+    self.dataConn = dataConn
+    self.depth = 0
+
+  def __enter__(self):
+    self.depth += 1
+    return self.dataConn
+
+  def __exit__(self, excType, excValue, traceback):
+    self.depth -= 1
+    if self.depth > 0:
+      return
+    if excType is None:
+      self.dataConn.commit()
+    else:
+      self.dataConn.rollback()
+
+
+class DirectWriter(object):
+  def __init__(self, transaction=None):
+    self.transaction = transaction
+
+  def submit(self, job):
+    if self.transaction is None:
+      job(None)
+      return
+    with self.transaction as dataConn:
+      job(dataConn)
+
+  def pending(self):
+    return False
+
+  def flush(self):
+    pass
+
+  def close(self):
+    pass
+
+
+class BackgroundWriter(object):
+  def __init__(self, connect):
+    self.connect = connect
+    self.jobs = queue.Queue()
+    self.error = None
+    self.thread = threading.Thread(target=self.run, daemon=True)
+    self.thread.start()
+
+  def submit(self, job):
+    self.jobs.put(job)
+
+  def pending(self):
+    return self.jobs.unfinished_tasks > 0
+
+  def run(self):
+    dataConn = self.connect()
+    running = True
+    while running:
+      batch = [self.jobs.get()]
+      while True:
+        try:
+          batch.append(self.jobs.get_nowait())
+        except queue.Empty:
+          break
+      if not dataConn.in_transaction:
+        dataConn.execute('BEGIN')
+      for job in batch:
+        if job is None:
+          running = False
+        else:
+          self.runJob(job, dataConn)
+      try:
+        dataConn.commit()
+      except Exception as error:
+        dataConn.rollback()
+        self.error = error
+      for job in batch:
+        self.jobs.task_done()
+    dataConn.close()
+
+  def runJob(self, job, dataConn):
+    dataConn.execute('SAVEPOINT job')
+    try:
+      job(dataConn)
+    except Exception as error:
+      self.error = error
+      if dataConn.in_transaction:
+        dataConn.execute('ROLLBACK TO job')
+    if dataConn.in_transaction:
+      dataConn.execute('RELEASE job')
+
+  def flush(self):
+    self.jobs.join()
+    if self.error is not None:
+      error, self.error = self.error, None
+      raise error
+
+  def close(self):
+    if self.thread.is_alive():
+      self.submit(None)
+      self.thread.join()
+    self.flush()
@@ -0,0 +1,210 @@
+import tkinter
+import tkinter.ttk
+import json
+import sys
+import time
+from TaskTimerCore import TaskTimeDb, TaskTime, TasksData, TasksDb, TasksJournal, DataFile, TimeFormatter, PresenceSource, WorkClock, Stats
+
+
+class TaskTimerApp(tkinter.Frame):
+  def __init__(self, master=None):
+    super().__init__(master)
+    self.stats = Stats() if '-stats' in sys.argv else None
+    self.nextTick = None
+    TaskTimeDb.stats = TasksData.stats = self.stats
+    self.db = TaskTimeDb('-bg' in sys.argv, threaded='-sync' not in sys.argv)
+    self.clock = WorkClock(self.db)
+    TaskTime.compactFormat = '-compact' in sys.argv
+    self.initSessionWatch()
+    self.configFile = DataFile('config.json')
+    config = self.configFile.forLoad()
+    if config is not None:
+      self.master.geometry(json.load(config)['position'])
+    
+    self.master.title('Task Timer')
+    self.master.grid_rowconfigure(0, weight=1)
+    self.master.grid_columnconfigure(0, weight=1)
+    self.grid(column=0, row=0, sticky=tkinter.NSEW)
+
+    self.master.protocol('WM_DELETE_WINDOW', self.finish)
+
+    self.dataFile = DataFile('tasksData.json')
+    binaryTimes = '-binary' in sys.argv
+    self.journal = TasksJournal(DataFile('tasksData.journal'), self.db.writer) if '-journal' in sys.argv or binaryTimes else None
+    if '-sqlite' in sys.argv:
+      self.tasks = TasksDb(self.db, self.dataFile.forLoad())
+    else:
+      self.tasks = TasksData(self.dataFile.forLoad(), self.journal, DataFile('tasksData.times') if binaryTimes else None, self.db.writer)
+    self.workstationActive = True
+
+    lastTask = self.tasks.getLastTask()
+    self.currentTask = tkinter.StringVar()
+    self.currentTask.set(lastTask)
+    self.currentTaskLabel = tkinter.ttk.Label(self, textvariable=self.currentTask, font=('Helvetica', 16))
+    self.currentTaskLabel.grid(column=0, row=0)
+    self.currentTime = tkinter.StringVar()
+    self.currentTimeLabel = tkinter.ttk.Label(self, textvariable=self.currentTime, font=('Helvetica', 14))
+    self.currentTimeLabel.grid(column=1, row=0, columnspan=2)
+    self.currentTimeFormat = TimeFormatter('hms', False)
+    self.taskBox = tkinter.ttk.Combobox(self, values=self.tasks.getActiveTasks())
+    self.taskBox.set(lastTask)
+    self.taskBox.grid(column=0, row=1)
+    self.setTaskButton = tkinter.Button(self, text='Set Selected Task', command=self.setTask)
+    self.setTaskButton.grid(column=1, row=1, columnspan=2)
+    self.copyTimeButton = tkinter.Button(self, text='Copy Time', command=self.copyTime)
+    self.copyTimeButton.grid(column=1, row=2)
+    self.deleteTaskButton = tkinter.Button(self, text='Delete Task', command=self.deleteTask)
+    self.deleteTaskButton.grid(column=2, row=2)
+    self.keepWhenClosedButton = tkinter.Button(self, text='Keep Timing When Closed', command=self.keepTiming, relief=self.getKeepTimingButtonRelief())
+    self.keepWhenClosedButton.grid(column=0, row=2)
+
+    self.repeatedRefresh()
+
+  def initSessionWatch(self):
+    import win32gui
+    import win32con
+    hwnd = self.master.winfo_id()
+    self.presence = WinPresenceSource(hwnd)
+    self.defaultProc = win32gui.SetWindowLong(hwnd, win32con.GWL_WNDPROC, self.winProc)
+
+  def winProc(self, hWnd, msg, wParam, lParam):
+    import win32gui
+    if msg == WinPresenceSource.WM_WTSSESSION_CHANGE:
+      self.presence.sessionChanged(wParam)
+      self.db.addEvent(self.db.closeId if wParam == WinPresenceSource.WTS_SESSION_LOCK else self.db.openId)
+    return win32gui.CallWindowProc(self.defaultProc, hWnd, msg, wParam, lParam)
+  
+  def save(self):
+    self.tasks.save(self.dataFile.forSave() if self.tasks.needsSnapshot() else None)
+
+  def finish(self):
+    self.db.close()
+    self.save()
+    self.db.writer.close()
+    self.tasks.close()
+    self.presence.close()
+    with self.configFile.forSave() as config:
+      json.dump({'position' : '+' + str(self.master.winfo_x()) + '+' + str(self.master.winfo_y())}, config)
+    if self.stats is not None:
+      self.stats.save(DataFile('taskTimerStats.json'))
+    self.master.destroy()
+
+  def refresh(self):
+    self.currentTime.set(str(self.clock.getWorkTime()))
+
+  def repeatedRefresh(self):
+    if self.stats is not None:
+      tickStart = time.monotonic()
+      if self.nextTick is not None:
+        self.stats.record('tick.lateness', max(0.0, tickStart - self.nextTick))
+    self.checkLock()
+    if self.workstationActive:
+      self.refresh()
+    delay = self.clock.getTickDelay()
+    if self.stats is not None:
+      tickEnd = time.monotonic()
+      self.stats.record('tick.duration', tickEnd - tickStart)
+      self.nextTick = tickEnd + delay / 1000.0
+    self.after(delay, self.repeatedRefresh)
+
+  def checkLock(self):
+    if self.workstationActive == self.presence.isLocked():
+      self.workstationActive = not self.workstationActive
+      self.save()
+      if self.workstationActive:
+        self.tasks.continueLastTask()
+        self.setKeepTimingButtonRelief()
+
+  def setTask(self):
+    newTask = self.taskBox.get()
+    self.tasks.add(newTask)
+    self.currentTask.set(newTask)
+    self.taskBox['values'] = self.tasks.getActiveTasks()
+    self.refresh()
+
+  def copyTime(self):
+    task = self.taskBox.get()
+    taskTime = self.tasks.getTaskTime(task)
+    self.tasks.updateTaskTime(task, taskTime)
+    self.master.clipboard_clear()
+    self.master.clipboard_append(TimeFormatter('dh', True).get(taskTime))
+
+  def deleteTask(self):
+    self.tasks.remove(self.taskBox.get())
+    self.taskBox.set('')
+    self.taskBox['values'] = self.tasks.getActiveTasks()
+    self.refresh()
+
+  def keepTiming(self):
+    self.tasks.keepTimingWhenOff = not self.tasks.keepTimingWhenOff
+    self.setKeepTimingButtonRelief()
+
+  def getKeepTimingButtonRelief(self):
+    return 'sunken' if self.tasks.keepTimingWhenOff else 'raised'
+
+  def setKeepTimingButtonRelief(self):
+    self.keepWhenClosedButton.config(relief=self.getKeepTimingButtonRelief())
+
+
+class WinPresenceSource(PresenceSource):
+  WM_WTSSESSION_CHANGE = 0x2B1
+  WTS_SESSION_LOCK = 7
+  WTS_SESSION_UNLOCK = 8
+  imageCacheLimit = 256
+
+  def __init__(self, hwnd):
+    import win32ts
+    super().__init__()
+    self.hwnd = hwnd
+    self.imageNames = {}
+    try:
+      win32ts.WTSRegisterSessionNotification(hwnd, win32ts.NOTIFY_FOR_ALL_SESSIONS)
+      self.notified = True
+    except Exception:
+      self.notified = False
+    self.locked = self.isForegroundLocked()
+
+  def sessionChanged(self, wParam):
+    if wParam == WinPresenceSource.WTS_SESSION_LOCK:
+      self.setLocked(True)
+    elif wParam == WinPresenceSource.WTS_SESSION_UNLOCK:
+      self.setLocked(False)
+
+  def isLocked(self):
+    if self.notified:
+      return self.locked
+    return self.isForegroundLocked()
+
+  def isForegroundLocked(self):
+    import win32gui
+    import win32process
+    windowId = win32gui.GetForegroundWindow()
+    if windowId == 0:
+      return True
+    thrid, pid = win32process.GetWindowThreadProcessId(windowId)
+    imageName = self.imageNames.get(pid)
+    if imageName is None:
+      if len(self.imageNames) >= WinPresenceSource.imageCacheLimit:
+        self.imageNames.clear()
+      imageName = self.imageNames[pid] = self.getImageName(pid)
+    return 'LockApp' in imageName
+
+  def getImageName(self, pid):
+    import win32api
+    import win32con
+    import win32process
+    try:
+      handle = win32api.OpenProcess(win32con.PROCESS_QUERY_INFORMATION | win32con.PROCESS_VM_READ, False, pid)
+    except Exception:
+      return ''
+    try:
+      return win32process.GetModuleFileNameEx(handle, 0)
+    except Exception:
+      return ''
+    finally:
+      win32api.CloseHandle(handle)
+
+  def close(self):
+    import win32ts
+    if self.notified:
+      win32ts.WTSUnRegisterSessionNotification(self.hwnd)
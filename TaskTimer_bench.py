@@ -0,0 +1,205 @@
+import sys
+import os
+import time
+import json
+import random
+import sqlite3
+import platform
+import tempfile
+import datetime
+import timeit
+import pathlib
+from TaskTimerCore import TaskTimeDb, TaskState, TaskTime, TasksData, DataFile, TimeFormatter, WorkClock, TimesheetExporter
+
+
+def fillEvents(db, days):
+  curs = db.dataConn.cursor()
+  start = datetime.datetime(2020, 1, 1, 8)
+  for dayIndex in range(days):
+    dayStart = start + datetime.timedelta(days=dayIndex)
+    for minutes, id in ((0, 'open'), (125, 'close'), (200, 'open'), (260, 'close'), (300, 'open'), (540, 'close')):
+      eventTime = dayStart + datetime.timedelta(minutes=minutes)
+      epoch = int(time.mktime(eventTime.timetuple()))
+      curs.execute('INSERT INTO Event(id, time, day, epoch, utcOffset) VALUES(?, ?, ?, ?, ?)',
+        (id, eventTime.strftime('%Y-%m-%d %H:%M:%S'), eventTime.strftime('%Y-%m-%d'), epoch, time.localtime(epoch).tm_gmtoff))
+  db.dataConn.commit()
+  db.syncExternalWrites()
+  return [start.date() + datetime.timedelta(days=dayIndex) for dayIndex in range(days)]
+
+
+def textWorkTime(db, day):
+  curs = db.dataConn.cursor()
+  start = curs.execute('SELECT time FROM Event WHERE date(time) = :day AND id != "close" ORDER BY time LIMIT 1', {'day' : day.isoformat()}).fetchone()
+  end = curs.execute('SELECT time FROM Event WHERE date(time) = :day AND id = "close" ORDER BY time DESC LIMIT 1', {'day' : day.isoformat()}).fetchone()
+  return datetime.datetime.fromisoformat(end[0]) - datetime.datetime.fromisoformat(start[0])
+
+
+def epochWorkTime(db, day):
+  return db.getDayWorkTime(day)
+
+
+def syntheticEvents(count):
+  start = time.mktime((2020, 1, 1, 8, 0, 0, 0, 0, -1))
+  return [('open' if index % 2 == 0 else 'close', start + index * 1800) for index in range(count)]
+
+
+def commitEach(db, events):
+  for id, epoch in events:
+    localNow = time.localtime(epoch)
+    event = (id, time.strftime('%Y-%m-%d %H:%M:%S', localNow), time.strftime('%Y-%m-%d', localNow), int(epoch), localNow.tm_gmtoff)
+    db.dataConn.execute('INSERT INTO Event(id, time, day, epoch, utcOffset) VALUES(?, ?, ?, ?, ?)', event)
+    db.dataConn.commit()
+    db.updateLunch(db.lastEvent, event)
+    db.dataConn.commit()
+    db.lastEvent = event
+
+
+def commitBatch(db, events):
+  db.addEvents(events)
+
+
+def runCommits(count=500):
+  events = syntheticEvents(count)
+  defaultPragmas = TaskTimeDb.pragmas
+  for name, pragmas, function in (('delete', (('journal_mode', 'DELETE'), ('synchronous', 'FULL')), commitEach),
+                                  ('wal', defaultPragmas, commitEach),
+                                  ('batch', defaultPragmas, commitBatch)):
+    TaskTimeDb.pragmas = pragmas
+    db = TaskTimeDb(None, 'bench.db')
+    elapsed = timeit.timeit(lambda: function(db, events), number=1)
+    print('%-6s %8.3f ms/event' % (name, elapsed * 1000 / count))
+    db.dataConn.close()
+    for suffix in ('', '-wal', '-shm', '-journal'):
+      pathlib.Path('data', 'bench.db' + suffix).unlink(True)
+  TaskTimeDb.pragmas = defaultPragmas
+
+
+def run(days=365, number=5):
+  db = TaskTimeDb(None, ':memory:')
+  dayList = fillEvents(db, days)
+  assert all(textWorkTime(db, day) == epochWorkTime(db, day) for day in dayList)
+  for name, function in (('text', textWorkTime), ('epoch', epochWorkTime)):
+    elapsed = timeit.timeit(lambda: [function(db, day) for day in dayList], number=number)
+    print('%-6s %8.3f ms/day' % (name, elapsed * 1000 / number / days))
+  db.dataConn.close()
+
+
+def historyEvents(years, rng):
+  events = []
+  day = datetime.date.today() - datetime.timedelta(days=365 * years)
+  while day < datetime.date.today():
+    if day.weekday() < 5:
+      dayStart = time.mktime((day.year, day.month, day.day, 7, 0, 0, 0, 0, -1)) + rng.randint(0, 7200)
+      offsets = [0, rng.randint(3 * 3600, 4 * 3600)]
+      offsets.append(offsets[-1] + rng.randint(1800, 3600))
+      for lock in range(rng.randint(0, 3)):
+        offsets.append(offsets[-1] + rng.randint(600, 3600))
+        offsets.append(offsets[-1] + rng.randint(60, 900))
+      offsets.append(max(offsets[-1] + 600, rng.randint(8 * 3600, 10 * 3600)))
+      events.extend(('open' if index % 2 == 0 else 'close', dayStart + offset) for index, offset in enumerate(offsets))
+    day += datetime.timedelta(days=1)
+  return events
+
+
+def historyTasks(years, switches, taskCount, rng):
+  tasks = [TaskState('TASK-%05d' % index) for index in range(taskCount)]
+  end = time.time() - 3600
+  epoch = end - 365 * 86400 * years
+  step = (end - epoch) / switches
+  times = []
+  for index in range(switches):
+    epoch += rng.uniform(0.5, 1.5) * step
+    name = None if rng.random() < 0.2 else tasks[min(int(rng.paretovariate(1.2)) - 1, taskCount - 1)].name
+    times.append(TaskTime.at(name, epoch))
+  tasksData = TasksData()
+  tasksData.tasks = tasks
+  tasksData.times = times
+  return tasksData
+
+
+def measure(results, name, function, number):
+  elapsed = timeit.timeit(function, number=number)
+  results[name] = {'seconds' : elapsed / number, 'number' : number}
+
+
+def runSuite(years=3, switches=200000, taskCount=2000, number=20):
+  rng = random.Random(2023)
+  results = {}
+  with tempfile.TemporaryDirectory() as workDir:
+    cwd = os.getcwd()
+    os.chdir(workDir)
+    try:
+      db = TaskTimeDb(None)
+      events = historyEvents(years, rng)
+      measure(results, 'db.addEvents', lambda: db.addEvents(events), 1)
+      days = sorted({datetime.date.fromtimestamp(epoch) for id, epoch in events})
+      sampleDays = [rng.choice(days) for index in range(number)]
+      measure(results, 'db.getDayWorkTime', lambda: db.getDayWorkTime(rng.choice(sampleDays)), number * 10)
+      measure(results, 'db.getLunchTime', lambda: db.getLunchTime(rng.choice(sampleDays)), number * 10)
+      measure(results, 'db.getReport.year', lambda: db.getReport(days[-1] - datetime.timedelta(days=365), days[-1]), number)
+      measure(results, 'db.getReport.all', lambda: db.getReport(days[0], days[-1]), max(1, number // 10))
+      def uncachedState():
+        db.generation += 1
+        db.getTodayState()
+      measure(results, 'db.getTodayState.uncached', uncachedState, number * 10)
+      measure(results, 'db.getTodayState.cached', db.getTodayState, number * 100)
+      clock = WorkClock(db)
+      measure(results, 'tick.workClock', lambda: str(clock.getWorkTime()), number * 100)
+      measure(results, 'tick.db', lambda: str(db.getTodayWorkTime() - db.getLunchTime()), number * 100)
+
+      tasksData = historyTasks(years, switches, taskCount, rng)
+      dataFile = DataFile('tasksData.json')
+      measure(results, 'tasks.save', lambda: tasksData.writeSnapshot({'tasks' : [item.toDict() for item in tasksData.tasks],
+        'times' : [tasksData.saveTime(item) for item in tasksData.times]}, dataFile.forSave()), max(1, number // 10))
+      results['tasks.save']['bytes'] = os.path.getsize(dataFile.fileName)
+      measure(results, 'tasks.load', lambda: TasksData(dataFile.forLoad(), resume=False), max(1, number // 10))
+      names = [item.name for item in tasksData.tasks]
+      measure(results, 'tasks.getTaskTime', lambda: tasksData.getTaskTime(rng.choice(names)), number * 100)
+      measure(results, 'tasks.getPeriodTaskTimes.day', lambda: tasksData.getPeriodTaskTimes('day'), max(1, number // 10))
+      measure(results, 'tasks.getPeriodTaskTimes.week', lambda: tasksData.getPeriodTaskTimes('week'), max(1, number // 10))
+      with open(os.devnull, 'w') as sink:
+        measure(results, 'export.tasks.csv', lambda: TimesheetExporter('csv').exportTimes(tasksData.iterTimes(), sink), max(1, number // 10))
+        measure(results, 'export.days.csv', lambda: TimesheetExporter('csv').exportDays(db.iterReport(days[0], days[-1]), sink), max(1, number // 10))
+      measure(results, 'tasks.getTaskTimeTillNow', lambda: tasksData.getTaskTimeTillNow(rng.choice(names)), number * 100)
+
+      for format, trimZeros in (('dh', True), ('hms', False), ('dhms', False)):
+        formatter = TimeFormatter(format, trimZeros)
+        measure(results, 'formatter.get.' + format, lambda: formatter.get(rng.uniform(0, 200 * 3600)), number * 1000)
+      db.dataConn.close()
+    finally:
+      os.chdir(cwd)
+  return {'python' : platform.python_version(), 'sqlite' : sqlite3.sqlite_version, 'date' : datetime.date.today().isoformat(),
+          'parameters' : {'years' : years, 'events' : len(events), 'switches' : switches, 'tasks' : taskCount, 'number' : number},
+          'results' : results}
+
+
+def compareSuites(basePath, currentPath):
+  with open(basePath) as source:
+    base = json.load(source)['results']
+  with open(currentPath) as source:
+    current = json.load(source)['results']
+  for name in sorted(set(base) & set(current)):
+    ratio = current[name]['seconds'] / base[name]['seconds'] if base[name]['seconds'] > 0 else float('inf')
+    print('%-30s %12.3f us %12.3f us %7.2fx' % (name, base[name]['seconds'] * 1e6, current[name]['seconds'] * 1e6, ratio))
+
+
+if __name__ == '__main__':
+  if '-compare' in sys.argv:
+    compareSuites(*sys.argv[sys.argv.index('-compare') + 1:][:2])
+  elif '-commits' in sys.argv:
+    runCommits(*[int(arg) for arg in sys.argv[2:]])
+  elif '-suite' in sys.argv:
+    arguments = [arg for arg in sys.argv[1:] if arg != '-suite']
+    output = None
+    if '-output' in arguments:
+      output = arguments[arguments.index('-output') + 1]
+      del arguments[arguments.index('-output'):arguments.index('-output') + 2]
+    report = runSuite(*[int(arg) for arg in arguments])
+    if output is None:
+      json.dump(report, sys.stdout, indent=2)
+      print()
+    else:
+      with open(output, 'w') as target:
+        json.dump(report, target, indent=2)
+  else:
+    run(*[int(arg) for arg in sys.argv[1:]])
@@ -1,10 +1,17 @@
 import unittest
 from TaskTimer import *
+from TaskTimerCli import main as cliMain
+import TaskTimer_bench
 import time
+import json
+import pathlib
+import sqlite3
 import io
 import os.path
 import tempfile
 import datetime
+import threading
+import sys
 
 
 class Test_TaskTimeDb(unittest.TestCase):
@@ -17,6 +24,8 @@ class Test_TaskTimeDb(unittest.TestCase):
 
   def tearDown(self):
     self.fullDb.unlink(True)
+    for suffix in ('-wal', '-shm'):
+      self.fullDb.with_name(self.dbName + suffix).unlink(True)
 
   def test_initDb(self):
     db = TaskTimeDb(False, self.dbName)
@@ -33,14 +42,156 @@ class Test_TaskTimeDb(unittest.TestCase):
   def test_initDb_existing(self):
     db = TaskTimeDb(False, self.dbName)
     db.addEvent('testEvent')
-    data = db.dataConn.cursor().execute('SELECT id FROM Event').fetchall()
+    data = db.dataConn.cursor().execute('SELECT id FROM Event ORDER BY rowid').fetchall()
     self.assertEqual([('open',),('testEvent',)], data)
     db.close()
     del db
     db = TaskTimeDb(True, self.dbName)
-    data = db.dataConn.cursor().execute('SELECT id FROM Event').fetchall()
+    data = db.dataConn.cursor().execute('SELECT id FROM Event ORDER BY rowid').fetchall()
     self.assertEqual([('open',),('testEvent',),('close',)], data)
 
+  def test_initDb_migrateLegacy(self):
+    if not self.dbDir.exists():
+      os.mkdir(self.dbDir)
+    legacyConn = sqlite3.connect(self.fullDb)
+    legacyConn.execute('CREATE TABLE Event(id TEXT, time TEXT)')
+    legacyConn.executemany('INSERT INTO Event(id, time) VALUES (?, ?)', (('open', '2023-10-17 07:10:25'), ('lunch', '2023-10-17 11:05:14'),
+                                                                         ('open', '2023-10-17 11:45:21'), ('close', '2023-10-17 16:02:30')))
+    legacyConn.commit()
+    legacyConn.close()
+    db = TaskTimeDb(True, self.dbName)
+    curs = db.dataConn.cursor()
+    self.assertEqual(curs.execute('PRAGMA user_version').fetchone()[0], len(TaskTimeDb.schema))
+    self.assertEqual(curs.execute('SELECT COUNT(*) FROM Event WHERE day = "2023-10-17" AND epoch IS NOT NULL').fetchone()[0], 4)
+    indexes = [item[0] for item in curs.execute('SELECT name FROM sqlite_master WHERE type = "index" AND tbl_name = "Event"')]
+    self.assertIn('EventDay', indexes)
+    self.assertIn('EventEpoch', indexes)
+    self.assertEqual(curs.execute('SELECT COUNT(*) FROM Event WHERE utcOffset = CAST(strftime("%s", time) AS INTEGER) - epoch').fetchone()[0], 4)
+    plan = curs.execute('EXPLAIN QUERY PLAN SELECT epoch FROM Event WHERE day = "2023-10-17" AND id = "close" ORDER BY time DESC LIMIT 1').fetchall()
+    self.assertIn('USING INDEX EventDay', plan[0][3])
+    self.assertEqual(db.getDayWorkTime(datetime.date(2023, 10, 17)), datetime.timedelta(hours=8, minutes=52, seconds=5))
+    self.assertEqual(db.getLunchTime(datetime.date(2023, 10, 17)), datetime.timedelta(minutes=40, seconds=7))
+    self.assertEqual(curs.execute('SELECT COUNT(*) FROM Event WHERE id = "lunch"').fetchone()[0], 0)
+    db.dataConn.close()
+
+  def test_addEvent_lastEventInMemory(self):
+    db = TaskTimeDb(False, self.dbName)
+    statements = []
+    db.dataConn.set_trace_callback(statements.append)
+    db.addEvent(db.openId)
+    self.assertEqual(statements, ['PRAGMA data_version'])
+    db.dataConn.set_trace_callback(None)
+    self.assertEqual(db.lastEvent[0], db.openId)
+
+  def test_addEvent_externalWrite(self):
+    db = TaskTimeDb(False, self.dbName)
+    otherDb = TaskTimeDb(True, self.dbName)
+    self.assertEqual(otherDb.lastEvent[0], otherDb.closeId)
+    db.addEvent(db.closeId)
+    self.assertEqual(db.lastEvent[0], db.closeId)
+    self.assertEqual(2, db.dataConn.cursor().execute('SELECT COUNT(*) FROM Event').fetchone()[0])
+    db.addEvent(db.openId)
+    self.assertEqual(3, db.dataConn.cursor().execute('SELECT COUNT(*) FROM Event').fetchone()[0])
+    otherDb.dataConn.close()
+    db.dataConn.close()
+
+  def test_addEvent_backgroundWriter(self):
+    db = TaskTimeDb(False, self.dbName, threaded=True)
+    db.addEvent('testEvent')
+    self.assertEqual(db.lastEvent[0], 'testEvent')
+    db.close()
+    db.writer.close()
+    data = db.dataConn.cursor().execute('SELECT id FROM Event ORDER BY rowid').fetchall()
+    self.assertEqual([('open',),('testEvent',),('close',)], data)
+    db.dataConn.close()
+
+  def test_backgroundWriter_error(self):
+    db = TaskTimeDb(None, self.dbName, threaded=True)
+    db.writer.submit(lambda dataConn: dataConn.execute('INSERT INTO Missing VALUES(1)'))
+    self.assertRaises(sqlite3.OperationalError, db.writer.flush)
+    db.addEvent(db.openId)
+    db.writer.close()
+    self.assertEqual(1, db.dataConn.cursor().execute('SELECT COUNT(*) FROM Event').fetchone()[0])
+    db.dataConn.close()
+
+  def test_backgroundWriter_errorInLastBatch(self):
+    db = TaskTimeDb(None, self.dbName, threaded=True)
+    release = threading.Event()
+    db.writer.submit(lambda dataConn: release.wait())
+    db.writer.submit(lambda dataConn: dataConn.execute('INSERT INTO Missing VALUES(1)'))
+    db.addEvent(db.openId)
+    db.writer.submit(None)
+    release.set()
+    db.writer.thread.join(5)
+    self.assertFalse(db.writer.thread.is_alive())
+    self.assertRaises(sqlite3.OperationalError, db.writer.close)
+    self.assertEqual(1, db.dataConn.cursor().execute('SELECT COUNT(*) FROM Event').fetchone()[0])
+    db.dataConn.close()
+
+  def test_TasksDbReadsQueuedSwitches(self):
+    db = TaskTimeDb(None, self.dbName, threaded=True)
+    taskData = TasksDb(db)
+    release = threading.Event()
+    db.writer.submit(lambda dataConn: release.wait())
+    TaskTime.timeProvider = lambda : time.struct_time((2020, 2, 26, 7, 0, 0, 2, 57, -1))
+    taskData.add('SDC-001')
+    TaskTime.timeProvider = lambda : time.struct_time((2020, 2, 26, 8, 0, 0, 2, 57, -1))
+    taskData.add('SDC-002')
+    threading.Timer(0.05, release.set).start()
+    self.assertEqual(taskData.getTaskTime('SDC-001'), 3600.0)
+    self.assertEqual(taskData.getDayTaskTimes(datetime.date(2020, 2, 26)), {'SDC-001' : 3600.0})
+    self.assertEqual([item.name for item in taskData.times], ['SDC-001', 'SDC-002'])
+    db.writer.close()
+    db.dataConn.close()
+
+  def test_TasksDbTwoConnections(self):
+    guiDb = TaskTimeDb(None, self.dbName, threaded=True)
+    guiTasks = TasksDb(guiDb)
+    TaskTime.timeProvider = lambda : time.struct_time((2020, 2, 26, 7, 0, 0, 2, 57, -1))
+    guiTasks.add('SDC-001')
+    guiDb.writer.flush()
+    cliDb = TaskTimeDb(None, self.dbName)
+    cliTasks = TasksDb(cliDb, resume=False)
+    TaskTime.timeProvider = lambda : time.struct_time((2020, 2, 26, 8, 0, 0, 2, 57, -1))
+    cliTasks.add('SDC-002')
+    cliDb.dataConn.close()
+    self.assertEqual(guiTasks.getActiveTasks(), ['SDC-001', 'SDC-002'])
+    self.assertEqual(guiTasks.getLastTask(), 'SDC-002')
+    TaskTime.timeProvider = lambda : time.struct_time((2020, 2, 26, 9, 0, 0, 2, 57, -1))
+    guiTasks.add('SDC-003')
+    self.assertEqual([(item.name, item.epoch) for item in guiTasks.times], [('SDC-001', time.mktime((2020, 2, 26, 7, 0, 0, 2, 57, -1))),
+      ('SDC-002', time.mktime((2020, 2, 26, 8, 0, 0, 2, 57, -1))), ('SDC-003', time.mktime((2020, 2, 26, 9, 0, 0, 2, 57, -1)))])
+    self.assertEqual(guiTasks.getDayTaskTimes(datetime.date(2020, 2, 26)), {'SDC-001' : 3600.0, 'SDC-002' : 3600.0})
+    self.assertEqual(guiDb.dataConn.execute('SELECT COUNT(*) FROM TaskSwitch WHERE endEpoch IS NULL').fetchone()[0], 1)
+    self.assertEqual(guiDb.dataConn.execute('SELECT name FROM Task ORDER BY id').fetchall(), [('SDC-001',), ('SDC-002',), ('SDC-003',)])
+    guiDb.writer.close()
+    guiDb.dataConn.close()
+
+  def test_addEvents(self):
+    db = TaskTimeDb(None, self.dbName)
+    self.assertEqual(db.dataConn.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+    statements = []
+    db.dataConn.set_trace_callback(statements.append)
+    db.addEvents([('open', time.mktime((2023, 10, 17, 7, 10, 25, 0, 0, -1))), ('close', time.mktime((2023, 10, 17, 11, 5, 14, 0, 0, -1))),
+                  ('open', time.mktime((2023, 10, 17, 11, 45, 21, 0, 0, -1))), ('close', time.mktime((2023, 10, 17, 16, 2, 30, 0, 0, -1)))])
+    db.dataConn.set_trace_callback(None)
+    self.assertEqual(statements.count('COMMIT'), 1)
+    self.assertEqual(db.lastEvent[0], db.closeId)
+    self.assertEqual(db.getDayWorkTime(datetime.date(2023, 10, 17)), datetime.timedelta(hours=8, minutes=52, seconds=5))
+    self.assertEqual(db.getLunchInterval(datetime.date(2023, 10, 17)), datetime.timedelta(minutes=40, seconds=7))
+    db.dataConn.close()
+
+  def test_transaction_nested(self):
+    db = TaskTimeDb(None, self.memDb)
+    with self.assertRaises(ValueError):
+      with db.transaction as dataConn:
+        dataConn.execute('INSERT INTO Event(id, time) VALUES("open", "2023-10-17 07:10:25")')
+        with db.transaction:
+          dataConn.execute('INSERT INTO Event(id, time) VALUES("close", "2023-10-17 11:05:14")')
+        self.assertTrue(dataConn.in_transaction)
+        raise ValueError()
+    self.assertEqual(0, db.dataConn.execute('SELECT COUNT(*) FROM Event').fetchone()[0])
+
   def fillTestData(self, db, data):
     today = datetime.date.today().isoformat()
     for item in data:
@@ -77,6 +228,114 @@ class Test_TaskTimeDb(unittest.TestCase):
     db.setLunchTime()
     self.assertEqual(db.getLunchTime(), datetime.timedelta(minutes=34, seconds=15))
 
+  def test_updateLunch(self):
+    db = TaskTimeDb(None, self.memDb)
+    events = tuple((id, text, text[:10], int(time.mktime(time.strptime(text, '%Y-%m-%d %H:%M:%S'))))
+      for id, text in (('open', '2023-10-17 07:10:25'), ('close', '2023-10-17 11:05:14'), ('open', '2023-10-17 11:45:21'), ('close', '2023-10-17 16:02:30'),
+                       ('open', '2023-10-18 07:27:00'), ('close', '2023-10-18 10:50:00'), ('open', '2023-10-18 11:24:15'), ('close', '2023-10-18 12:10:00')))
+    for previous, event in zip((None,) + events[:-1], events):
+      db.updateLunch(previous, event)
+    self.assertEqual(db.getLunchInterval(datetime.date(2023, 10, 17)), datetime.timedelta(minutes=40, seconds=7))
+    self.assertEqual(db.getLunchInterval(datetime.date(2023, 10, 18)), datetime.timedelta(minutes=34, seconds=15))
+    self.assertEqual(db.dataConn.execute('SELECT COUNT(*) FROM DayLunch').fetchone()[0], 2)
+
+  def test_getReport(self):
+    db = TaskTimeDb(True, self.memDb)
+    self.fillTestData(db, (('open', '2023-10-17 07:10:25'), ('close', '2023-10-17 11:05:14'),
+                           ('open', '2023-10-17 11:45:21'), ('close', '2023-10-17 16:02:30'),
+                           ('open', '2023-10-18 07:51:00'), ('close', '2023-10-18 10:47:00'),
+                           ('open', '2023-10-19 09:00:35'), ('close', '2023-10-19 10:50:00'), ('open', '2023-10-19 11:05:00'),
+                           ('close', '2023-10-19 12:00:00'), ('open', '2023-10-19 12:40:00'), ('close', '2023-10-19 17:34:57'),
+                           ('open', '2023-10-21 08:00:00'), ('close', '2023-10-21 11:30:00'), ('open', '2023-10-23 08:00:00')))
+    self.assertEqual(db.backfillLunch(), 5)
+    self.assertEqual(db.backfillLunch(), 2)
+    report = db.getReport(datetime.date(2023, 10, 16), datetime.date(2023, 10, 21))
+    self.assertEqual([item.day for item in report], [datetime.date(2023, 10, 16) + datetime.timedelta(days=day) for day in range(6)])
+    for item in report:
+      self.assertEqual(item.workTime, db.getDayWorkTime(item.day))
+      self.assertEqual(item.lunchTime, db.getLunchTime(item.day))
+    self.assertEqual(report[1].lunchTime, datetime.timedelta(minutes=40, seconds=7))
+    self.assertEqual(report[2].lunchTime, datetime.timedelta(0))
+    self.assertEqual(report[3].lunchTime, datetime.timedelta(minutes=30))
+    self.assertEqual(report[5].lunchStart, report[5].start + 3 * 3600 + 30 * 60)
+    self.assertIsNone(report[5].lunchEnd)
+    self.assertEqual(report[5].lunchTime, datetime.timedelta(0))
+
+  def test_rollup(self):
+    db = TaskTimeDb(True, self.memDb)
+    self.fillTestData(db, (('open', '2023-10-17 07:10:25'), ('close', '2023-10-17 11:05:14'),
+                           ('open', '2023-10-17 11:45:21'), ('close', '2023-10-17 16:02:30'),
+                           ('open', '2023-10-18 07:51:00'), ('close', '2023-10-18 10:47:00'),
+                           ('open', '2023-10-19 09:00:35'), ('close', '2023-10-19 10:50:00'), ('open', '2023-10-19 11:05:00'),
+                           ('close', '2023-10-19 12:00:00'), ('open', '2023-10-19 12:40:00'), ('close', '2023-10-19 17:34:57'),
+                           ('open', '2023-10-21 08:00:00'), ('close', '2023-10-21 11:30:00')))
+    db.setLunchTime(datetime.date(2023, 10, 17))
+    fromDay, toDay = datetime.date(2023, 10, 16), datetime.date(2023, 10, 21)
+    days = [fromDay + datetime.timedelta(days=day) for day in range(6)]
+    expected = ([item.toDict() for item in db.getReport(fromDay, toDay)], [(db.getDayWorkTime(day), db.getLunchTime(day)) for day in days])
+    self.assertEqual(db.rollup(datetime.date(2023, 10, 25)), 3)
+    self.assertEqual(db.dataConn.execute('SELECT COUNT(*) FROM Event').fetchone()[0], 2)
+    self.assertEqual(db.dataConn.execute('SELECT COUNT(*) FROM EventArchive').fetchone()[0], 12)
+    self.assertEqual(([item.toDict() for item in db.getReport(fromDay, toDay)], [(db.getDayWorkTime(day), db.getLunchTime(day)) for day in days]), expected)
+    self.assertEqual(db.rollup(datetime.date(2023, 10, 25)), 0)
+    self.assertEqual(db.dataConn.execute('SELECT day FROM DayLunch').fetchall(), [('2023-10-17',)])
+
+  def test_iterReport(self):
+    db = TaskTimeDb(True, self.memDb)
+    self.fillTestData(db, (('open', '2023-10-17 07:10:25'), ('close', '2023-10-17 11:05:14'),
+                           ('open', '2023-10-17 11:45:21'), ('close', '2023-10-17 16:02:30'),
+                           ('open', '2023-10-18 07:51:00'), ('close', '2023-10-18 10:47:00'),
+                           ('open', '2023-10-21 08:00:00'), ('close', '2023-10-21 11:30:00'), ('open', '2023-10-23 08:00:00')))
+    db.backfillLunch()
+    db.rollup(datetime.date(2023, 10, 18))
+    fromDay, toDay = datetime.date(2023, 10, 16), datetime.date(2023, 10, 23)
+    reports = db.iterReport(fromDay, toDay)
+    self.assertNotIsInstance(reports, list)
+    self.assertEqual([item.toDict() for item in reports], [item.toDict() for item in db.getReport(fromDay, toDay) if item.start is not None])
+
+  def test_todayStateCache(self):
+    db = TaskTimeDb(True, self.memDb)
+    self.fillTestData(db, (('open', '07:12:36'), ('close', '11:02:10'), ('open', '11:36:12'), ('close', '15:31:47')))
+    db.setLunchTime()
+    self.assertEqual(db.getTodayWorkTime() - db.getLunchTime(), datetime.timedelta(hours=7, minutes=45, seconds=9))
+    self.assertEqual((db.cacheHits, db.cacheMisses), (2, 1))
+    self.assertEqual(db.getTodayWorkTime() - db.getLunchTime(), datetime.timedelta(hours=7, minutes=45, seconds=9))
+    self.assertEqual((db.cacheHits, db.cacheMisses), (5, 1))
+    db.addEvent(db.openId)
+    db.getTodayWorkTime()
+    self.assertEqual((db.cacheHits, db.cacheMisses), (5, 2))
+
+  def test_workClock(self):
+    db = TaskTimeDb(True, self.memDb)
+    self.fillTestData(db, (('open', '07:12:36'), ('close', '11:02:10'), ('open', '11:36:12')))
+    db.setLunchTime()
+    clocks = {'monotonic' : 100.0, 'wall' : time.mktime(datetime.date.today().timetuple()) + 12 * 3600 + 0.25}
+    clock = WorkClock(db, lambda : clocks['monotonic'], lambda : clocks['wall'])
+    statements = []
+    db.dataConn.set_trace_callback(statements.append)
+    self.assertEqual(clock.getWorkTime(), datetime.timedelta(hours=4, minutes=13, seconds=22))
+    self.assertEqual(clock.getTickDelay(), 751)
+    for tick in range(5):
+      clocks['monotonic'] += 1.0
+      clocks['wall'] += 1.0
+      clock.getWorkTime()
+    self.assertEqual(statements, [])
+    self.assertEqual(clock.getWorkTime(), datetime.timedelta(hours=4, minutes=13, seconds=27))
+    clocks['monotonic'] += 1.0
+    clocks['wall'] += 3600.0
+    self.assertEqual(clock.getWorkTime(), datetime.timedelta(hours=5, minutes=13, seconds=27))
+    self.assertEqual(clock.syncs, 2)
+    db.dataConn.set_trace_callback(None)
+    db.addEvent(db.closeId)
+    clocks['monotonic'] += 1.0
+    clocks['wall'] += 1.0
+    clock.getWorkTime()
+    self.assertEqual(clock.syncs, 3)
+
+
+def localTime(values):
+  return list(time.localtime(time.mktime(values)))
+
 
 class DataIO(io.StringIO):
   def __init__(self, *args, **kwargs):
@@ -107,7 +366,7 @@ class Test_TaskTimerTest(unittest.TestCase):
 
   def test_TaskStateToDict(self):
     task = TaskState({'name' : 'SDC-987', 'reportedTime' : 345.0, 'active' : True})
-    self.assertEqual(task.__dict__, {'name' : 'SDC-987', 'reportedTime' : 345.0, 'active' : True})
+    self.assertEqual(task.toDict(), {'name' : 'SDC-987', 'reportedTime' : 345.0, 'active' : True})
 
   def test_TaskTimeFromString(self):
     TaskTime.timeProvider = lambda : time.struct_time((2020, 2, 25, 8, 12, 0, 1, 56, -1))
@@ -119,22 +378,25 @@ class Test_TaskTimerTest(unittest.TestCase):
     self.assertEqual(task1.name, 'SDC-099')
     self.assertEqual(task2.name, 'SDC-001')
     self.assertEqual(idle.name, None)
-    self.assertEqual(task1.time, time.struct_time((2020, 2, 25, 8, 12, 0, 1, 56, -1)))
-    self.assertEqual(task2.time, time.struct_time((2020, 2, 25, 12, 20, 0, 1, 56, -1)))
-    self.assertEqual(idle.time, time.struct_time((2020, 2, 25, 14, 52, 30, 1, 56, -1)))
+    self.assertEqual(task1.getTime(), time.mktime((2020, 2, 25, 8, 12, 0, 1, 56, -1)))
+    self.assertEqual(task2.getTime(), time.mktime((2020, 2, 25, 12, 20, 0, 1, 56, -1)))
+    self.assertEqual(idle.getTime(), time.mktime((2020, 2, 25, 14, 52, 30, 1, 56, -1)))
 
   def test_TaskTimeFromDict(self):
     task1 = TaskTime({'name' : 'SDC-987', 'time' : [2020, 2, 25, 8, 12, 0, 1, 56, -1]})
     self.assertEqual(task1.name, 'SDC-987')
-    self.assertEqual(task1.time, time.struct_time((2020, 2, 25, 8, 12, 0, 1, 56, -1)))
+    self.assertEqual(task1.getTime(), time.mktime((2020, 2, 25, 8, 12, 0, 1, 56, -1)))
     task2 = TaskTime({'name' : None, 'time' : [2020, 2, 25, 11, 3, 0, 1, 56, -1]})
     self.assertEqual(task2.name, None)
-    self.assertEqual(task2.time, time.struct_time((2020, 2, 25, 11, 3, 0, 1, 56, -1)))
+    self.assertEqual(task2.getTime(), time.mktime((2020, 2, 25, 11, 3, 0, 1, 56, -1)))
     self.assertEqual(task2.getTime() - task1.getTime(), 3 * 3600 - 9 * 60)
 
   def test_TaskTimeToDict(self):
     task = TaskTime({'name' : 'SDC-987', 'time' : [2020, 2, 25, 8, 12, 0, 1, 56, -1]})
-    self.assertEqual(task.__dict__, {'name' : 'SDC-987', 'time' : time.struct_time((2020, 2, 25, 8, 12, 0, 1, 56, -1))})
+    self.assertEqual(task.toDict(), {'name' : 'SDC-987', 'time' : localTime((2020, 2, 25, 8, 12, 0, 1, 56, -1))})
+    TaskTime.compactFormat = True
+    self.assertEqual(task.toDict(), {'name' : 'SDC-987', 'time' : time.mktime((2020, 2, 25, 8, 12, 0, 1, 56, -1))})
+    TaskTime.compactFormat = False
 
   def test_TasksDataFromJson(self):
     data = DataIO('''{ "tasks" : [ {"name" : "SDC-001", "reportedTime" : 0.0, "active" : true},
@@ -154,11 +416,11 @@ class Test_TaskTimerTest(unittest.TestCase):
     self.assertFalse(taskData.keepTimingWhenOff)
     self.assertEqual(len(taskData.times), 3)
     self.assertEqual(taskData.times[0].name, 'SDC-001')
-    self.assertEqual(taskData.times[0].time, time.struct_time((2020, 2, 26, 7, 43, 0, 2, 57, -1)))
+    self.assertEqual(taskData.times[0].getTime(), time.mktime((2020, 2, 26, 7, 43, 0, 2, 57, -1)))
     self.assertEqual(taskData.times[1].name, None)
-    self.assertEqual(taskData.times[1].time, time.struct_time((2020, 2, 26, 11, 21, 30, 2, 57, -1)))
+    self.assertEqual(taskData.times[1].getTime(), time.mktime((2020, 2, 26, 11, 21, 30, 2, 57, -1)))
     self.assertEqual(taskData.times[2].name, 'SDC-002')
-    self.assertEqual(taskData.times[2].time, time.struct_time((2020, 2, 26, 11, 50, 45, 2, 57, -1)))
+    self.assertEqual(taskData.times[2].getTime(), time.mktime((2020, 2, 26, 11, 50, 45, 2, 57, -1)))
     self.assertEqual(taskData.times[1].getTime() - taskData.times[0].getTime(), 4 * 3600 - 22 * 60 + 30)
     self.assertEqual(taskData.times[2].getTime() - taskData.times[1].getTime(), 29 * 60 + 15)
 
@@ -181,13 +443,13 @@ class Test_TaskTimerTest(unittest.TestCase):
     self.assertFalse(taskData.keepTimingWhenOff)
     self.assertEqual(len(taskData.times), 4)
     self.assertEqual(taskData.times[0].name, 'SDC-001')
-    self.assertEqual(taskData.times[0].time, time.struct_time((2020, 2, 26, 7, 43, 0, 2, 57, -1)))
+    self.assertEqual(taskData.times[0].getTime(), time.mktime((2020, 2, 26, 7, 43, 0, 2, 57, -1)))
     self.assertEqual(taskData.times[1].name, 'SDC-002')
-    self.assertEqual(taskData.times[1].time, time.struct_time((2020, 2, 26, 11, 21, 30, 2, 57, -1)))
+    self.assertEqual(taskData.times[1].getTime(), time.mktime((2020, 2, 26, 11, 21, 30, 2, 57, -1)))
     self.assertEqual(taskData.times[2].name, None)
-    self.assertEqual(taskData.times[2].time, time.struct_time((2020, 2, 26, 11, 50, 45, 2, 57, -1)))
+    self.assertEqual(taskData.times[2].getTime(), time.mktime((2020, 2, 26, 11, 50, 45, 2, 57, -1)))
     self.assertEqual(taskData.times[3].name, 'SDC-002')
-    self.assertEqual(taskData.times[3].time, time.struct_time((2020, 2, 26, 15, 32, 0, 1, 56, -1)))
+    self.assertEqual(taskData.times[3].getTime(), time.mktime((2020, 2, 26, 15, 32, 0, 1, 56, -1)))
 
   def test_TasksDataToJson(self):
     taskData = TasksData()
@@ -205,8 +467,8 @@ class Test_TaskTimerTest(unittest.TestCase):
     testData = json.loads(jsonData.result)
     self.assertEqual(testData, {'tasks' : [{'name' : 'SDC-007', 'reportedTime' : 100.0, 'active' : True},
                                            {'name' : 'SDC-008', 'reportedTime' : 47.0, 'active' : False}],
-                               'times' : [{'name' : None, 'time' : [2020, 2, 25, 11, 2, 0, 1, 56, -1]},
-                                          {'name' : 'SDC-007', 'time' : [2020, 2, 25, 12, 26, 0, 1, 56, -1]}] })
+                               'times' : [{'name' : None, 'time' : localTime((2020, 2, 25, 11, 2, 0, 1, 56, -1))},
+                                          {'name' : 'SDC-007', 'time' : localTime((2020, 2, 25, 12, 26, 0, 1, 56, -1))}] })
 
   def test_TasksDataToJson_NotKeepingTimingAfterSave(self):
     TaskTime.timeProvider = lambda : time.struct_time((2020, 2, 25, 18, 43, 0, 2, 56, -1))
@@ -224,9 +486,29 @@ class Test_TaskTimerTest(unittest.TestCase):
     testData = json.loads(jsonData.result)
     self.assertEqual(testData, {'tasks' : [{'name' : 'SDC-007', 'reportedTime' : 100.0, 'active' : True},
                                            {'name' : 'SDC-008', 'reportedTime' : 47.0, 'active' : False}],
-                               'times' : [{'name' : None, 'time' : [2020, 2, 25, 11, 2, 0, 1, 56, -1]},
-                                          {'name' : 'SDC-007', 'time' : [2020, 2, 25, 12, 26, 0, 1, 56, -1]},
-                                          {'name' : None, 'time' : [2020, 2, 25, 18, 43, 0, 2, 56, -1]}] })
+                               'times' : [{'name' : None, 'time' : localTime((2020, 2, 25, 11, 2, 0, 1, 56, -1))},
+                                          {'name' : 'SDC-007', 'time' : localTime((2020, 2, 25, 12, 26, 0, 1, 56, -1))},
+                                          {'name' : None, 'time' : localTime((2020, 2, 25, 18, 43, 0, 2, 56, -1))}] })
+
+  def test_TasksDataCompactFormat(self):
+    data = io.StringIO('''{ "tasks" : [ {"name" : "SDC-001", "reportedTime" : 0.0, "active" : false} ],
+      "times" : [ { "name" : "SDC-001", "time" : [2020, 2, 26, 7, 43, 0, 2, 57, -1] },
+      { "name" : null, "time" : 1582710090.0 } ] }''')
+    taskData = TasksData(data)
+    self.assertFalse(hasattr(taskData.times[0], '__dict__'))
+    self.assertEqual(taskData.times[1].getTime(), 1582710090.0)
+    TaskTime.compactFormat = True
+    taskData.keepTimingWhenOff = True
+    jsonData = DataIO()
+    taskData.save(jsonData)
+    TaskTime.compactFormat = False
+    testData = json.loads(jsonData.result)
+    self.assertEqual(testData['times'], [[0, time.mktime((2020, 2, 26, 7, 43, 0, 2, 57, -1))], [None, 1582710090.0]])
+    taskData = TasksData(io.StringIO(jsonData.result))
+    self.assertEqual([item.name for item in taskData.times], ['SDC-001', None])
+    self.assertIs(taskData.times[0].name, taskData.tasks[0].name)
+    self.assertEqual(taskData.times[0].getTime(), time.mktime((2020, 2, 26, 7, 43, 0, 2, 57, -1)))
+    self.assertEqual(taskData.getTaskTime('SDC-001'), 1582710090.0 - time.mktime((2020, 2, 26, 7, 43, 0, 2, 57, -1)))
 
   def test_TasksDataAddCurrentTask(self):
     taskData = TasksData()
@@ -242,11 +524,11 @@ class Test_TaskTimerTest(unittest.TestCase):
     self.assertTrue(taskData.tasks[0].active)
     self.assertEqual(len(taskData.times), 3)
     self.assertEqual(taskData.times[0].name, 'SDC-011')
-    self.assertEqual(taskData.times[0].time, time.struct_time((2020, 2, 26, 7, 43, 0, 2, 57, -1)))
+    self.assertEqual(taskData.times[0].getTime(), time.mktime((2020, 2, 26, 7, 43, 0, 2, 57, -1)))
     self.assertEqual(taskData.times[1].name, None)
-    self.assertEqual(taskData.times[0].time, time.struct_time((2020, 2, 26, 7, 43, 0, 2, 57, -1)))
+    self.assertEqual(taskData.times[0].getTime(), time.mktime((2020, 2, 26, 7, 43, 0, 2, 57, -1)))
     self.assertEqual(taskData.times[2].name, 'SDC-011')
-    self.assertEqual(taskData.times[0].time, time.struct_time((2020, 2, 26, 7, 43, 0, 2, 57, -1)))
+    self.assertEqual(taskData.times[0].getTime(), time.mktime((2020, 2, 26, 7, 43, 0, 2, 57, -1)))
 
   def test_TasksDataRemoveTask(self):
     data = io.StringIO('''{ "tasks" : [ { "name" : "SDC-001", "reportedTime" : 150.0, "active" : true },
@@ -322,6 +604,25 @@ class Test_TaskTimerTest(unittest.TestCase):
     self.assertEqual(taskData.getTaskTime('SDC-002'), 5 * 3600 - 8 * 60 -15 + 2 * 3600 + 45 * 60)
     self.assertEqual(taskData.getTaskTime('SDC-003'), 0.0)
 
+  def test_TasksDataGetTaskTimeAfterAdd(self):
+    data = io.StringIO('''{ "tasks" : [ { "name" : "SDC-001", "reportedTime" : 600.0, "active" : true } ],
+      "times" : [ { "name" : "SDC-001", "time" : [2020, 2, 26, 7, 43, 0, 2, 57, -1] },
+      { "name" : null, "time" : [2020, 2, 26, 11, 21, 30, 2, 57, -1] } ] }''')
+    TaskTime.timeProvider = lambda : time.struct_time((2020, 2, 26, 11, 30, 0, 2, 57, -1))
+    taskData = TasksData(data)
+    TaskTime.timeProvider = lambda : time.struct_time((2020, 2, 26, 12, 0, 0, 2, 57, -1))
+    taskData.add('SDC-002')
+    TaskTime.timeProvider = lambda : time.struct_time((2020, 2, 26, 13, 15, 0, 2, 57, -1))
+    taskData.add('SDC-001')
+    TaskTime.timeProvider = lambda : time.struct_time((2020, 2, 26, 14, 0, 0, 2, 57, -1))
+    taskData.add(None)
+    self.assertEqual(taskData.getTaskTime('SDC-001'), 4 * 3600 - 22 * 60 + 30 + 30 * 60 + 45 * 60 - 600.0)
+    self.assertEqual(taskData.getTaskTime('SDC-002'), 75 * 60)
+    self.assertEqual(taskData.getTaskTime(None), 8 * 60 + 30)
+    taskData.times = list(taskData.times)
+    self.assertEqual(taskData.getTaskTime('SDC-001'), 4 * 3600 - 22 * 60 + 30 + 30 * 60 + 45 * 60 - 600.0)
+    self.assertEqual(taskData.getTaskTime('SDC-002'), 75 * 60)
+
   def test_TasksDataGetTaskTimeTillNow(self):
     currTime = int(time.time())
     task1Time = time.localtime(currTime - 10 * 3600)
@@ -358,6 +659,398 @@ class Test_TaskTimerTest(unittest.TestCase):
     self.assertEqual(taskData.find('SDC-001').reportedTime, 15600.0)
     self.assertEqual(taskData.find('SDC-002').reportedTime, 2400.0)
 
+  def test_TasksDataFindIndex(self):
+    data = io.StringIO('''{ "tasks" : [ { "name" : "SDC-001", "reportedTime" : 150.0, "active" : true },
+      { "name" : "SDC-002", "reportedTime" : 78.0, "active" : false } ],
+      "times" : [] }''')
+    taskData = TasksData(data)
+    self.assertIs(taskData.find('SDC-002'), taskData.tasks[1])
+    self.assertIsNone(taskData.find('SDC-003'))
+    taskData.add('SDC-003')
+    self.assertIs(taskData.find('SDC-003'), taskData.tasks[2])
+    taskData.remove('SDC-003')
+    self.assertFalse(taskData.find('SDC-003').active)
+    taskData.add('SDC-003')
+    self.assertEqual(len(taskData.tasks), 3)
+    taskData.tasks = [TaskState('SDC-007')]
+    self.assertIs(taskData.find('SDC-007'), taskData.tasks[0])
+    self.assertIsNone(taskData.find('SDC-001'))
+
+  def test_TasksDataJournal(self):
+    with tempfile.TemporaryDirectory() as tempDir:
+      snapshotFile = DataFile(os.path.join(tempDir, 'tasksData.json'))
+      journalFile = DataFile(os.path.join(tempDir, 'tasksData.journal'))
+      taskData = TasksData(snapshotFile.forLoad(), TasksJournal(journalFile))
+      TaskTime.timeProvider = lambda : time.struct_time((2020, 2, 26, 7, 43, 0, 2, 57, -1))
+      taskData.add('SDC-001')
+      TaskTime.timeProvider = lambda : time.struct_time((2020, 2, 26, 9, 11, 0, 2, 57, -1))
+      taskData.add('SDC-002')
+      taskData.updateTaskTime('SDC-001', 600.0)
+      taskData.remove('SDC-001')
+      self.assertFalse(os.path.exists(snapshotFile.fileName))
+      self.assertFalse(taskData.needsSnapshot())
+      taskData.save(None)
+      taskData.journal.close()
+      with journalFile.forLoad() as source:
+        self.assertEqual(len(source.readlines()), 5)
+
+      reloaded = TasksData(snapshotFile.forLoad(), TasksJournal(journalFile))
+      self.assertEqual([item.name for item in reloaded.tasks], ['SDC-001', 'SDC-002'])
+      self.assertFalse(reloaded.find('SDC-001').active)
+      self.assertEqual(reloaded.find('SDC-001').reportedTime, 600.0)
+      self.assertEqual([item.name for item in reloaded.times], ['SDC-001', 'SDC-002', None, 'SDC-002'])
+      self.assertEqual(reloaded.getTaskTime('SDC-001'), 88 * 60 - 600.0)
+
+      reloaded.keepTimingWhenOff = True
+      reloaded.save(snapshotFile.forSave())
+      reloaded.journal.close()
+      with journalFile.forLoad() as source:
+        self.assertEqual(source.read(), '')
+      with snapshotFile.forLoad() as source:
+        self.assertEqual(json.load(source)['journal'], 6)
+
+      with journalFile.forAppend() as target:
+        target.write('{"op" : "add", "name" : "SDC-003", "seq" : 5, "time" : [2020, 2, 26, 10, 0, 0, 2, 57, -1]}\n{"op" : "add", "na')
+      reloaded = TasksData(snapshotFile.forLoad(), TasksJournal(journalFile))
+      self.assertEqual(len(reloaded.times), 4)
+      TaskTime.timeProvider = lambda : time.struct_time((2020, 2, 26, 11, 0, 0, 2, 57, -1))
+      reloaded.add('SDC-004')
+      reloaded.journal.close()
+      reloaded = TasksData(snapshotFile.forLoad(), TasksJournal(journalFile))
+      self.assertEqual([item.name for item in reloaded.times], ['SDC-001', 'SDC-002', None, 'SDC-002', 'SDC-004'])
+      reloaded.journal.close()
+
+  def test_TasksDataBinaryTimes(self):
+    with tempfile.TemporaryDirectory() as tempDir:
+      snapshotFile = DataFile(os.path.join(tempDir, 'tasksData.json'))
+      journalFile = DataFile(os.path.join(tempDir, 'tasksData.journal'))
+      timesFile = DataFile(os.path.join(tempDir, 'tasksData.times'))
+      with snapshotFile.forSave() as target:
+        target.write('''{ "tasks" : [ { "name" : "SDC-001", "reportedTime" : 600.0, "active" : true } ],
+          "times" : [ { "name" : "SDC-001", "time" : [2020, 2, 26, 7, 43, 0, 2, 57, -1] },
+          { "name" : null, "time" : [2020, 2, 26, 11, 21, 30, 2, 57, -1] } ] }''')
+      TaskTime.timeProvider = lambda : time.struct_time((2020, 2, 26, 12, 0, 0, 2, 57, -1))
+      self.assertRaises(ValueError, TasksData, None, None, timesFile)
+      taskData = TasksData(snapshotFile.forLoad(), TasksJournal(journalFile), timesFile)
+      self.assertIsInstance(taskData.times, TimesStore)
+      TaskTime.timeProvider = lambda : time.struct_time((2020, 2, 26, 13, 15, 0, 2, 57, -1))
+      taskData.add('SDC-002')
+      TaskTime.timeProvider = lambda : time.struct_time((2020, 2, 26, 14, 0, 0, 2, 57, -1))
+      taskData.save(snapshotFile.forSave())
+      taskData.close()
+      self.assertEqual(os.path.getsize(timesFile.fileName), 5 * TimesStore.record.size)
+      with snapshotFile.forLoad() as source:
+        self.assertEqual(json.load(source)['times'], [])
+
+      with timesFile.forAppend(True) as target:
+        target.write(b'torn')
+      reader = TasksData(snapshotFile.forLoad(), TasksJournal(journalFile), timesFile, resume=False, readOnly=True)
+      self.assertEqual(len(reader.times), 5)
+      self.assertEqual(reader.getTaskTime('SDC-002'), 45 * 60)
+      reader.close()
+      self.assertEqual(os.path.getsize(timesFile.fileName), 5 * TimesStore.record.size + 4)
+      taskData = TasksData(snapshotFile.forLoad(), TasksJournal(journalFile), timesFile)
+      self.assertEqual(len(taskData.times), 6)
+      self.assertEqual([item.name for item in taskData.times], ['SDC-001', None, 'SDC-001', 'SDC-002', None, 'SDC-002'])
+      self.assertEqual(taskData.times[-3].getTime(), time.mktime((2020, 2, 26, 13, 15, 0, 2, 57, -1)))
+      self.assertEqual([item.name for item in taskData.times[1:3]], [None, 'SDC-001'])
+      self.assertEqual(taskData.getTaskTime('SDC-001'), 4 * 3600 - 22 * 60 + 30 + 75 * 60 - 600.0)
+      self.assertEqual(taskData.getTaskTime('SDC-002'), 45 * 60)
+      self.assertEqual(taskData.getLastTask(), 'SDC-002')
+      taskData.close()
+      self.assertEqual(os.path.getsize(timesFile.fileName), 6 * TimesStore.record.size)
+
+  def test_TasksDataBinaryTimesCrash(self):
+    with tempfile.TemporaryDirectory() as tempDir:
+      snapshotFile = DataFile(os.path.join(tempDir, 'tasksData.json'))
+      journalFile = DataFile(os.path.join(tempDir, 'tasksData.journal'))
+      timesFile = DataFile(os.path.join(tempDir, 'tasksData.times'))
+      with snapshotFile.forSave() as target:
+        target.write('''{ "tasks" : [ { "name" : "SDC-001", "reportedTime" : 0.0, "active" : true } ],
+          "times" : [ { "name" : "SDC-001", "time" : [2020, 2, 26, 7, 43, 0, 2, 57, -1] } ] }''')
+      jobs = []
+      writer = DirectWriter()
+      writer.submit = jobs.append
+      taskData = TasksData(snapshotFile.forLoad(), TasksJournal(journalFile, writer), timesFile, resume=False)
+      TaskTime.timeProvider = lambda : time.struct_time((2020, 2, 26, 9, 0, 0, 2, 57, -1))
+      taskData.add('NEW-1')
+      self.assertEqual(len(jobs), 3)
+      for job in jobs[:2]:
+        job(None)
+      taskData.times.target.close()
+      taskData.journal.close()
+      reloaded = TasksData(snapshotFile.forLoad(), TasksJournal(journalFile), timesFile, resume=False)
+      self.assertEqual([item.name for item in reloaded.times], ['SDC-001'])
+      self.assertEqual([item.name for item in reloaded.tasks], ['SDC-001', 'NEW-1'])
+      reloaded.close()
+
+      with timesFile.forAppend(True) as target:
+        target.write(TimesStore.record.pack(time.mktime((2020, 2, 26, 10, 0, 0, 2, 57, -1)), 7))
+      reloaded = TasksData(snapshotFile.forLoad(), TasksJournal(journalFile), timesFile, resume=False)
+      self.assertEqual([item.name for item in reloaded.times], ['SDC-001'])
+      reloaded.add('SDC-001')
+      reloaded.close()
+      self.assertEqual(os.path.getsize(timesFile.fileName), 2 * TimesStore.record.size)
+
+  def test_TasksDbImportAndSwitch(self):
+    db = TaskTimeDb(True, ':memory:')
+    data = io.StringIO('''{ "tasks" : [ { "name" : "SDC-001", "reportedTime" : 15000.0, "active" : true },
+      { "name" : "SDC-002", "reportedTime" : 0.0, "active" : false } ],
+      "times" : [ { "name" : "SDC-001", "time" : [2020, 2, 26, 7, 43, 0, 2, 57, -1] },
+      { "name" : null, "time" : [2020, 2, 26, 11, 21, 30, 2, 57, -1] },
+      { "name" : "SDC-002", "time" : [2020, 2, 26, 11, 50, 45, 2, 57, -1] },
+      { "name" : null, "time" : [2020, 2, 26, 16, 42, 30, 2, 57, -1] },
+      { "name" : "SDC-002", "time" : [2020, 2, 27, 7, 10, 0, 3, 58, -1] },
+      { "name" : "SDC-001", "time" : [2020, 2, 27, 9, 55, 0, 3, 58, -1] } ] }''')
+    taskData = TasksDb(db, data)
+    self.assertEqual([item.name for item in taskData.tasks], ['SDC-001', 'SDC-002'])
+    self.assertEqual(len(taskData.times), 6)
+    self.assertEqual(taskData.getTaskTime('SDC-001'), 4 * 3600 - 22 * 60 + 30 - 15000.0)
+    self.assertEqual(taskData.getTaskTime('SDC-002'), 5 * 3600 - 8 * 60 -15 + 2 * 3600 + 45 * 60)
+    self.assertEqual(taskData.getTaskTime('SDC-003'), 0.0)
+    self.assertEqual(taskData.getDayTaskTimes(datetime.date(2020, 2, 26)), {'SDC-001' : 4 * 3600 - 22 * 60 + 30, None : 29 * 60 + 15 + 14 * 3600 + 27 * 60 + 30,
+                                                                             'SDC-002' : 5 * 3600 - 8 * 60 - 15})
+    self.assertEqual(taskData.getLastTask(), 'SDC-001')
+
+    TaskTime.timeProvider = lambda : time.struct_time((2020, 2, 27, 10, 25, 0, 3, 58, -1))
+    taskData.add('SDC-003')
+    taskData.updateTaskTime('SDC-001', 600.0)
+    taskData.remove('SDC-002')
+    TaskTime.timeProvider = lambda : time.struct_time((2020, 2, 27, 11, 0, 0, 3, 58, -1))
+    taskData.save(None)
+    reloaded = TasksDb(db)
+    self.assertEqual([(item.name, item.reportedTime, item.active) for item in reloaded.tasks],
+                     [('SDC-001', 15600.0, True), ('SDC-002', 0.0, False), ('SDC-003', 0.0, True)])
+    self.assertEqual([item.name for item in reloaded.times], ['SDC-001', None, 'SDC-002', None, 'SDC-002', 'SDC-001', 'SDC-003', None, 'SDC-003'])
+    self.assertEqual(reloaded.getTaskTime('SDC-001'), 4 * 3600 - 22 * 60 + 30 + 30 * 60 - 15600.0)
+    self.assertEqual(reloaded.getTaskTime('SDC-003'), 35 * 60)
+    plan = db.dataConn.execute('EXPLAIN QUERY PLAN SELECT TOTAL(endEpoch - epoch) FROM TaskSwitch WHERE taskId IS 0 AND endEpoch IS NOT NULL').fetchall()
+    self.assertIn('TaskSwitchTask', plan[0][3])
+
+  def test_TasksDataRollup(self):
+    with tempfile.TemporaryDirectory() as tempDir:
+      snapshotFile = DataFile(os.path.join(tempDir, 'tasksData.json'))
+      archiveFile = DataFile(os.path.join(tempDir, 'tasksData.archive'))
+      with snapshotFile.forSave() as target:
+        target.write('''{ "tasks" : [ { "name" : "SDC-001", "reportedTime" : 600.0, "active" : true },
+          { "name" : "SDC-002", "reportedTime" : 0.0, "active" : true } ],
+          "times" : [ { "name" : "SDC-001", "time" : [2020, 2, 26, 7, 43, 0, 2, 57, -1] },
+          { "name" : "SDC-002", "time" : [2020, 2, 26, 22, 0, 0, 2, 57, -1] },
+          { "name" : null, "time" : [2020, 2, 27, 2, 30, 0, 3, 58, -1] },
+          { "name" : "SDC-001", "time" : [2020, 2, 28, 9, 0, 0, 4, 59, -1] } ] }''')
+      taskData = TasksData(snapshotFile.forLoad(), resume=False)
+      expected = {name : taskData.getTaskTime(name) for name in ('SDC-001', 'SDC-002')}
+      self.assertEqual(taskData.rollup(datetime.date(2020, 2, 28), archiveFile), 3)
+      self.assertEqual([item.name for item in taskData.times], ['SDC-001'])
+      self.assertEqual(taskData.days[('2020-02-26', 'SDC-002')], 2 * 3600)
+      self.assertEqual(taskData.days[('2020-02-27', 'SDC-002')], 2.5 * 3600)
+      taskData.keepTimingWhenOff = True
+      taskData.save(snapshotFile.forSave())
+      reloaded = TasksData(snapshotFile.forLoad(), resume=False)
+      self.assertEqual({name : reloaded.getTaskTime(name) for name in ('SDC-001', 'SDC-002')}, expected)
+      self.assertEqual(reloaded.getLastTask(), 'SDC-001')
+      with archiveFile.forLoad() as source:
+        self.assertEqual([json.loads(line)['name'] for line in source], ['SDC-001', 'SDC-002', None])
+      imported = TasksDb(TaskTimeDb(True, ':memory:'), snapshotFile.forLoad(), resume=False)
+      self.assertEqual({name : imported.getTaskTime(name) for name in ('SDC-001', 'SDC-002')}, expected)
+      self.assertEqual(imported.getDayTaskTimes(datetime.date(2020, 2, 27)), {'SDC-002' : 2.5 * 3600, None : 21.5 * 3600})
+
+  def test_TasksDbRollup(self):
+    db = TaskTimeDb(True, ':memory:')
+    data = io.StringIO('''{ "tasks" : [ { "name" : "SDC-001", "reportedTime" : 0.0, "active" : true } ],
+      "times" : [ { "name" : "SDC-001", "time" : [2020, 2, 26, 7, 43, 0, 2, 57, -1] },
+      { "name" : null, "time" : [2020, 2, 26, 11, 21, 30, 2, 57, -1] },
+      { "name" : "SDC-001", "time" : [2020, 2, 27, 7, 10, 0, 3, 58, -1] },
+      { "name" : null, "time" : [2020, 2, 27, 9, 55, 0, 3, 58, -1] } ] }''')
+    taskData = TasksDb(db, data, resume=False)
+    day = datetime.date(2020, 2, 26)
+    expected = (taskData.getTaskTime('SDC-001'), taskData.getDayTaskTimes(day))
+    self.assertEqual(taskData.rollup(datetime.date(2020, 2, 27)), 2)
+    self.assertEqual(len(taskData.times), 2)
+    self.assertEqual((taskData.getTaskTime('SDC-001'), taskData.getDayTaskTimes(day)), expected)
+    self.assertEqual(taskData.getLastTask(), 'SDC-001')
+    self.assertEqual(len(taskData.index), 2)
+    taskData.keepTimingWhenOff = True
+    jsonData = DataIO()
+    taskData.save(jsonData)
+    snapshot = TasksData(io.StringIO(jsonData.result), resume=False)
+    self.assertEqual(snapshot.days, taskData.days)
+    self.assertEqual(snapshot.getPeriodTaskTimes(), taskData.getPeriodTaskTimes())
+
+  def test_TasksDataGetPeriodTaskTimes(self):
+    data = io.StringIO('''{ "tasks" : [ { "name" : "SDC-001", "reportedTime" : 0.0, "active" : true },
+      { "name" : "SDC-002", "reportedTime" : 0.0, "active" : true } ],
+      "days" : [ [ "2020-02-25", "SDC-001", 3600.0 ] ],
+      "times" : [ { "name" : "SDC-001", "time" : [2020, 2, 26, 7, 43, 0, 2, 57, -1] },
+      { "name" : null, "time" : [2020, 2, 26, 11, 21, 30, 2, 57, -1] },
+      { "name" : "SDC-002", "time" : [2020, 2, 26, 22, 0, 0, 2, 57, -1] },
+      { "name" : "SDC-003", "time" : [2020, 2, 27, 2, 30, 0, 3, 58, -1] },
+      { "name" : "SDC-001", "time" : [2020, 2, 27, 2, 30, 0, 3, 58, -1] },
+      { "name" : null, "time" : [2020, 3, 2, 9, 0, 0, 0, 62, -1] } ] }''')
+    taskData = TasksData(data, resume=False)
+    useNumpy = TaskAggregator.useNumpy
+    try:
+      results = []
+      for TaskAggregator.useNumpy in ((False, True) if useNumpy else (False,)):
+        results.append([taskData.getPeriodTaskTimes(), taskData.getPeriodTaskTimes('week')])
+    finally:
+      TaskAggregator.useNumpy = useNumpy
+    for days, weeks in results:
+      self.assertEqual(days[:5], [('2020-02-25', 'SDC-001', 3600.0), ('2020-02-26', None, 10 * 3600 + 38 * 60 + 30),
+                                  ('2020-02-26', 'SDC-001', 3 * 3600 + 38 * 60 + 30), ('2020-02-26', 'SDC-002', 2 * 3600),
+                                  ('2020-02-27', 'SDC-001', 21.5 * 3600)])
+      self.assertEqual(days[-1], ('2020-03-02', 'SDC-001', 9 * 3600))
+      self.assertEqual(weeks, [('2020-02-24', None, 10 * 3600 + 38 * 60 + 30), ('2020-02-24', 'SDC-001', taskData.getTaskTime('SDC-001') - 9 * 3600),
+                               ('2020-02-24', 'SDC-002', 4.5 * 3600), ('2020-03-02', 'SDC-001', 9 * 3600)])
+    self.assertEqual(results[0], results[-1])
+    self.assertRaises(ValueError, TaskAggregator, 'month')
+
+  def test_TasksDataIntervalIndex(self):
+    with tempfile.TemporaryDirectory() as tempDir:
+      snapshotFile = DataFile(os.path.join(tempDir, 'tasksData.json'))
+      journalFile = DataFile(os.path.join(tempDir, 'tasksData.journal'))
+      with snapshotFile.forSave() as target:
+        target.write('''{ "tasks" : [ { "name" : "SDC-001", "reportedTime" : 0.0, "active" : true } ],
+          "times" : [ { "name" : "SDC-001", "time" : [2020, 2, 26, 7, 0, 0, 2, 57, -1] },
+          { "name" : null, "time" : [2020, 2, 26, 11, 0, 0, 2, 57, -1] } ] }''')
+      taskData = TasksData(snapshotFile.forLoad(), TasksJournal(journalFile), resume=False)
+      TaskTime.timeProvider = lambda : time.struct_time((2020, 2, 26, 12, 0, 0, 2, 57, -1))
+      taskData.add('SDC-002')
+      TaskTime.timeProvider = lambda : time.struct_time((2020, 2, 26, 16, 0, 0, 2, 57, -1))
+      taskData.add(None)
+      at = lambda hour, minute=0 : time.mktime((2020, 2, 26, hour, minute, 0, 2, 57, -1))
+      self.assertEqual([taskData.getTaskAt(at(hour)) for hour in (6, 7, 10, 11, 12, 17)], [None, 'SDC-001', 'SDC-001', None, 'SDC-002', None])
+      self.assertEqual(taskData.getOverlappingTimes(at(10), at(13)), [('SDC-001', at(10), at(11)), (None, at(11), at(12)), ('SDC-002', at(12), at(13))])
+      self.assertEqual(taskData.getOverlappingTimes(at(12), at(12, 30)), [('SDC-002', at(12), at(12, 30))])
+
+      taskData.reassign(at(9), at(9, 30), 'SDC-003')
+      taskData.reassign(at(10, 30), at(12), 'SDC-002')
+      self.assertRaises(ValueError, taskData.reassign, at(15), at(17), 'SDC-003')
+      self.assertEqual([(item.name, item.epoch) for item in taskData.times], [('SDC-001', at(7)), ('SDC-003', at(9)), ('SDC-001', at(9, 30)),
+                                                                               ('SDC-002', at(10, 30)), ('SDC-002', at(12)), (None, at(16))])
+      self.assertEqual(taskData.getTaskAt(at(11)), 'SDC-002')
+      names = (None, 'SDC-001', 'SDC-002', 'SDC-003')
+      totals = [taskData.getTaskTime(name) for name in names]
+      taskData.times = list(taskData.times)
+      self.assertEqual([taskData.getTaskTime(name) for name in names], totals)
+      self.assertEqual(taskData.getTaskTime('SDC-001'), 3 * 3600)
+      taskData.journal.close()
+
+      reloaded = TasksData(snapshotFile.forLoad(), TasksJournal(journalFile), resume=False)
+      self.assertEqual([(item.name, item.epoch) for item in reloaded.times], [(item.name, item.epoch) for item in taskData.times])
+      self.assertEqual(reloaded.getOverlappingTimes(at(9), at(11)), taskData.getOverlappingTimes(at(9), at(11)))
+      reloaded.journal.close()
+
+      db = TaskTimeDb(True, ':memory:')
+      with snapshotFile.forSave() as target:
+        target.write('''{ "tasks" : [ { "name" : "SDC-001", "reportedTime" : 0.0, "active" : true } ],
+          "times" : [ { "name" : "SDC-001", "time" : [2020, 2, 26, 7, 0, 0, 2, 57, -1] },
+          { "name" : null, "time" : [2020, 2, 26, 11, 0, 0, 2, 57, -1] } ] }''')
+      taskDb = TasksDb(db, snapshotFile.forLoad(), resume=False)
+      TaskTime.timeProvider = lambda : time.struct_time((2020, 2, 26, 12, 0, 0, 2, 57, -1))
+      taskDb.add('SDC-002')
+      TaskTime.timeProvider = lambda : time.struct_time((2020, 2, 26, 16, 0, 0, 2, 57, -1))
+      taskDb.add(None)
+      self.assertEqual(taskDb.getOverlappingTimes(at(10), at(13)), [('SDC-001', at(10), at(11)), (None, at(11), at(12)), ('SDC-002', at(12), at(13))])
+      taskDb.reassign(at(9), at(9, 30), 'SDC-003')
+      taskDb.reassign(at(10, 30), at(12), 'SDC-002')
+      self.assertEqual([(item.name, item.epoch) for item in taskDb.times], [(item.name, item.epoch) for item in taskData.times])
+      self.assertEqual([taskDb.getTaskTime(name) for name in ('SDC-001', 'SDC-002', 'SDC-003')],
+                       [taskData.getTaskTime(name) for name in ('SDC-001', 'SDC-002', 'SDC-003')])
+      self.assertEqual(taskDb.getTaskAt(at(9, 15)), 'SDC-003')
+
+  def test_TimesheetExporter(self):
+    data = io.StringIO('''{ "tasks" : [ { "name" : "SDC-001", "reportedTime" : 0.0, "active" : true } ],
+      "times" : [ { "name" : "SDC-001", "time" : [2020, 2, 26, 7, 0, 0, 2, 57, -1] },
+      { "name" : null, "time" : [2020, 2, 26, 11, 0, 0, 2, 57, -1] },
+      { "name" : "SDC-002, UI", "time" : [2020, 2, 26, 11, 30, 0, 2, 57, -1] },
+      { "name" : "SDC-001", "time" : [2020, 2, 27, 8, 0, 0, 3, 58, -1] },
+      { "name" : null, "time" : [2020, 2, 27, 9, 15, 0, 3, 58, -1] } ] }''')
+    taskData = TasksData(data, resume=False)
+    dayStart = time.mktime((2020, 2, 27, 0, 0, 0, 0, 0, -1))
+    self.assertEqual(list(taskData.iterTimes(dayStart, task='SDC-001')), [('SDC-001', dayStart + 8 * 3600, dayStart + 9.25 * 3600)])
+    self.assertEqual(len(list(taskData.iterTimes(end=dayStart))), 3)
+
+    target = io.StringIO()
+    self.assertEqual(TimesheetExporter('csv').exportTimes(taskData.iterTimes(end=dayStart), target), 2)
+    self.assertEqual(target.getvalue().splitlines(), ['task,start,end,duration', 'SDC-001,2020-02-26 07:00:00,2020-02-26 11:00:00,4h 0m 0s',
+                                                      '"SDC-002, UI",2020-02-26 11:30:00,2020-02-27 00:00:00,12h 30m 0s'])
+    target = io.StringIO()
+    TimesheetExporter('jsonl', TimeFormatter('dh', True)).exportTimes(taskData.iterTimes(dayStart), target)
+    self.assertEqual([json.loads(line) for line in target.getvalue().splitlines()],
+                     [{'task' : 'SDC-002, UI', 'start' : '2020-02-27 00:00:00', 'end' : '2020-02-27 08:00:00', 'duration' : '1d'},
+                      {'task' : 'SDC-001', 'start' : '2020-02-27 08:00:00', 'end' : '2020-02-27 09:15:00', 'duration' : '2h'}])
+    target = io.StringIO()
+    self.assertEqual(TimesheetExporter('ics').exportTimes(taskData.iterTimes(), target), 3)
+    lines = target.getvalue().split('\r\n')
+    self.assertEqual((lines[0], lines[-2], lines[-1]), ('BEGIN:VCALENDAR', 'END:VCALENDAR', ''))
+    self.assertEqual(lines.count('BEGIN:VEVENT'), 3)
+    self.assertIn('SUMMARY:SDC-002\\, UI', lines)
+    self.assertIn('DTSTART:' + datetime.datetime.fromtimestamp(dayStart + 8 * 3600, datetime.timezone.utc).strftime('%Y%m%dT%H%M%SZ'), lines)
+    target = io.StringIO()
+    TimesheetExporter('ics').exportTimes([('SDC-004 ' + 'Ünicode ticket title ' * 8, dayStart, dayStart + 3600)], target)
+    lines = target.getvalue().split('\r\n')
+    summary = lines.index([line for line in lines if line.startswith('SUMMARY:')][0])
+    self.assertTrue(all(len(line.encode()) <= 75 for line in lines))
+    self.assertEqual(lines[-3], 'END:VEVENT')
+    self.assertTrue(all(line.startswith(' ') for line in lines[summary + 1:-3]))
+    self.assertEqual(lines[summary][8:] + ''.join(line[1:] for line in lines[summary + 1:-3]), 'SDC-004 ' + 'Ünicode ticket title ' * 8)
+    self.assertRaises(ValueError, TimesheetExporter, 'xml')
+
+  def test_PresenceSourceCheckLock(self):
+    try:
+      from TaskTimerGui import TaskTimerApp
+    except ImportError:
+      self.skipTest('tkinter is not available')
+    TaskTime.timeProvider = time.localtime
+    with tempfile.TemporaryDirectory() as dataDir:
+      app = TaskTimerApp.__new__(TaskTimerApp)
+      app.presence = FakePresenceSource([False, True, True, False])
+      app.workstationActive = True
+      app.tasks = TasksData()
+      app.tasks.add('SDC-012')
+      app.dataFile = DataFile(os.path.join(dataDir, 'tasksData.json'))
+      app.setKeepTimingButtonRelief = lambda : None
+      states = []
+      for tick in range(4):
+        app.checkLock()
+        states.append(app.workstationActive)
+      self.assertEqual(states, [True, False, False, True])
+      self.assertEqual(app.presence.calls, 4)
+      self.assertEqual([item.name for item in app.tasks.times], ['SDC-012', None, None, 'SDC-012'])
+      self.assertTrue(os.path.exists(app.dataFile.fileName))
+
+  def test_StatsInstrumentation(self):
+    stats = Stats()
+    TaskTimeDb.stats = TasksData.stats = stats
+    try:
+      db = TaskTimeDb(False, ':memory:')
+      db.getDayWorkTime(datetime.date.today())
+      tasksData = TasksData(DataIO('{"tasks" : [{"name" : "SDC-012", "reportedTime" : 0.0, "active" : true}], "times" : []}'), resume=False)
+      dataIO = DataIO()
+      tasksData.save(dataIO)
+    finally:
+      TaskTimeDb.stats = TasksData.stats = None
+    result = stats.toDict()
+    queries = [name for name in result['histograms'] if name.startswith('query INSERT INTO Event')]
+    self.assertEqual(len(queries), 1)
+    self.assertEqual(result['histograms'][queries[0]]['count'], 1)
+    self.assertEqual(result['counters']['rows SELECT epoch FROM Event WHERE day = :day AND id != :closeId ORDER BY epoch LIMIT 1'], 1)
+    self.assertEqual(result['histograms']['tasks.load']['count'], 1)
+    self.assertEqual(result['histograms']['tasks.save']['count'], 1)
+    self.assertEqual(result['counters']['tasks.save.bytes'], len(dataIO.result))
+    self.assertGreater(result['counters']['tasks.load.bytes'], 0)
+    self.assertNotIsInstance(TaskTimeDb(None, ':memory:').dataConn, TimedConnection)
+
+  def test_StatsHistogram(self):
+    histogram = Histogram()
+    for value in (0.00005, 0.002, 0.002, 5.0):
+      histogram.add(value)
+    data = histogram.toDict()
+    self.assertEqual(data['count'], 4)
+    self.assertEqual(data['max'], 5.0)
+    self.assertEqual(data['buckets'], {'<=0.0001' : 1, '<=0.003' : 2, '>3.0' : 1})
+
   def test_DataFileForLoadAndSave(self):
     with tempfile.TemporaryDirectory() as tempDir:
       nonExistingFile = DataFile(os.path.join(tempDir, 'nonExisting.json'))
@@ -375,6 +1068,25 @@ class Test_TaskTimerTest(unittest.TestCase):
         self.assertEqual(data['first'], 123)
         self.assertEqual(data['second'], 'just string')
 
+  def test_TasksDataQueuedSnapshots(self):
+    with tempfile.TemporaryDirectory() as tempDir:
+      dataFile = DataFile(os.path.join(tempDir, 'tasksData.json'))
+      writer = BackgroundWriter(lambda: sqlite3.connect(':memory:'))
+      release = threading.Event()
+      writer.submit(lambda dataConn: release.wait())
+      taskData = TasksData(writer=writer)
+      taskData.keepTimingWhenOff = True
+      taskData.add('SDC-001')
+      taskData.save(dataFile.forSave())
+      taskData.keepTimingWhenOff = True
+      taskData.tasks = []
+      taskData.times = []
+      taskData.save(dataFile.forSave())
+      release.set()
+      writer.close()
+      with dataFile.forLoad() as source:
+        self.assertEqual(json.load(source), {'tasks' : [], 'times' : []})
+
   def test_TimeFormatterInit(self):
     format = TimeFormatter('dh', True)
     self.assertEqual(format.units, [('d', 8 * 3600), ('h', 3600)])
@@ -432,5 +1144,103 @@ class Test_TaskTimerTest(unittest.TestCase):
     self.assertEqual(format.get(8 * 3600), '0h 1d')
 
 
+class Test_TaskTimerCli(unittest.TestCase):
+  def setUp(self):
+    self.cwd = os.getcwd()
+    self.dataDir = tempfile.TemporaryDirectory()
+    os.chdir(self.dataDir.name)
+    TaskTime.timeProvider = time.localtime
+
+  def tearDown(self):
+    os.chdir(self.cwd)
+    self.dataDir.cleanup()
+
+  def runCli(self, *args):
+    output = io.StringIO()
+    self.assertEqual(cliMain(list(args), output), 0)
+    return output.getvalue()
+
+  def test_eventAndReport(self):
+    self.runCli('event', 'open')
+    self.runCli('event', 'close')
+    today = datetime.date.today().isoformat()
+    report = json.loads(self.runCli('report', '--from', today, '--to', today))
+    self.assertEqual(len(report), 1)
+    self.assertEqual(report[0]['day'], today)
+    self.assertIsNotNone(report[0]['start'])
+    self.assertIsNotNone(report[0]['end'])
+    lines = self.runCli('--format', 'csv', 'report', '--from', today, '--to', today).splitlines()
+    self.assertEqual(lines[0], 'day,start,end,lunchStart,lunchEnd,workTime,lunchTime')
+    self.assertTrue(lines[1].startswith(today + ','))
+
+  def test_reportWithoutDatabase(self):
+    errors = io.StringIO()
+    stderr, sys.stderr = sys.stderr, errors
+    try:
+      self.assertEqual(cliMain(['report'], io.StringIO()), 1)
+      self.assertEqual(cliMain(['export', 'days', 'csv'], io.StringIO()), 1)
+    finally:
+      sys.stderr = stderr
+    self.assertEqual(errors.getvalue().splitlines(), ['TaskTimerCli: error: unable to open database file'] * 2)
+
+  def test_reportReadOnly(self):
+    self.runCli('event', 'open')
+    db = TaskTimeDb(None, readOnly=True)
+    self.assertRaises(sqlite3.OperationalError, db.dataConn.execute, 'DELETE FROM Event')
+    db.dataConn.close()
+
+  def test_switchAndTaskTime(self):
+    for sqlite in ((), ('--sqlite',)):
+      self.runCli(*sqlite, 'switch', 'SDC-012')
+      self.runCli(*sqlite, 'switch', 'SDC-013')
+      times = json.loads(self.runCli(*sqlite, 'task-time', 'SDC-012', 'SDC-013'))
+      self.assertEqual([item['name'] for item in times], ['SDC-012', 'SDC-013'])
+      self.assertGreaterEqual(times[0]['time'], 0.0)
+      lines = self.runCli(*sqlite, '--format', 'csv', 'task-time', 'SDC-013').splitlines()
+      self.assertEqual(lines[0], 'name,time')
+    with open('tasksData.json') as source:
+      data = json.load(source)
+    self.assertEqual([item['name'] for item in data['tasks']], ['SDC-012', 'SDC-013'])
+    self.assertEqual([item['name'] for item in data['times']], ['SDC-012', 'SDC-013'])
+
+  def test_binaryReportsReadOnly(self):
+    self.runCli('--binary', 'switch', 'SDC-012')
+    self.runCli('--binary', 'switch', 'SDC-013')
+    with open('tasksData.times', 'ab') as target:
+      target.write(b'torn')
+    size = os.path.getsize('tasksData.times')
+    times = json.loads(self.runCli('--binary', 'task-time', 'SDC-012', 'SDC-013'))
+    self.assertEqual([item['name'] for item in times], ['SDC-012', 'SDC-013'])
+    self.assertEqual(json.loads(self.runCli('--binary', 'task-at', datetime.datetime.now().isoformat()))[0]['name'], 'SDC-013')
+    self.assertEqual(os.path.getsize('tasksData.times'), size)
+
+  def test_export(self):
+    self.runCli('event', 'open')
+    self.runCli('event', 'close')
+    self.runCli('switch', 'SDC-012')
+    self.runCli('switch', 'SDC-013')
+    today = datetime.date.today().isoformat()
+    lines = self.runCli('export', 'days', 'csv', '--from', today).splitlines()
+    self.assertEqual(lines[0], 'day,start,end,workTime,lunchTime')
+    self.assertTrue(lines[1].startswith(today + ','))
+    self.runCli('export', 'tasks', 'ics', '--task', 'SDC-012', '--output', 'tasks.ics')
+    with open('tasks.ics', newline='') as source:
+      content = source.read()
+    self.assertTrue(content.startswith('BEGIN:VCALENDAR\r\n'))
+    self.assertEqual(content.count('SUMMARY:SDC-012\r\n'), 1)
+    self.assertNotIn('SDC-013', content)
+
+
+class Test_TaskTimerBench(unittest.TestCase):
+  def test_runSuite(self):
+    report = TaskTimer_bench.runSuite(1, 500, 20, 1)
+    self.assertEqual(report['parameters']['switches'], 500)
+    self.assertGreater(report['parameters']['events'], 0)
+    for name in ('db.getReport.year', 'db.getTodayState.uncached', 'tick.workClock', 'tasks.save', 'tasks.load', 'tasks.getTaskTime', 'formatter.get.dh'):
+      self.assertGreater(report['results'][name]['seconds'], 0.0)
+    self.assertGreater(report['results']['tasks.save']['bytes'], 0)
+    json.dumps(report)
+
+
 if __name__ == '__main__':
   unittest.main()